@@ -2,8 +2,10 @@ import logging
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
 
+from bot.db import DbStorage
 from config import settings
 
 logging.basicConfig(
@@ -20,4 +22,12 @@ bot = Bot(
     default=DefaultBotProperties(),
 )
 
-dp = Dispatcher(storage=MemoryStorage())
+
+def create_storage() -> BaseStorage:
+    """Создает хранилище FSM по настройке fsm_storage"""
+    if settings.fsm_storage == "db":
+        return DbStorage(ttl=settings.fsm_state_ttl)
+    return MemoryStorage()
+
+
+dp = Dispatcher(storage=create_storage())
@@ -1,21 +1,57 @@
-from .database import create_tables
-from .models import User
+from .cache import user_cache
+from .coordination import Listener, advisory_lock, notify
+from .database import (
+    create_tables,
+    engine,
+    on_commit,
+    outside_unit_of_work,
+    unit_of_work,
+)
+from .fsm_storage import DbStorage
+from .models import FsmState, QueueMember, StoredQueue, User
+from .pool import pool_metrics
+from .queue_repository import apply_queue_ops, get_stored_queues
 from .repository import (
     create_user,
     get_all_trusted_users,
     get_all_users,
     get_user,
+    get_users_by_tg_ids,
+    get_users_page,
+    reload_users,
+    subscribe_user_updates,
     update_user,
     update_user_by_id,
+    update_users_trust_by_ids,
 )
 
 __all__ = [
+    "apply_queue_ops",
+    "get_stored_queues",
     "create_user",
     "get_all_trusted_users",
     "get_all_users",
     "get_user",
+    "get_users_by_tg_ids",
+    "get_users_page",
+    "reload_users",
+    "subscribe_user_updates",
     "update_user",
     "update_user_by_id",
+    "update_users_trust_by_ids",
+    "advisory_lock",
+    "notify",
     "create_tables",
+    "engine",
+    "DbStorage",
+    "pool_metrics",
+    "on_commit",
+    "outside_unit_of_work",
+    "unit_of_work",
+    "user_cache",
+    "FsmState",
+    "Listener",
+    "QueueMember",
+    "StoredQueue",
     "User",
 ]
@@ -0,0 +1,147 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from time import monotonic
+from typing import Iterable, Sequence
+
+from sqlalchemy import inspect
+
+from bot.db.models import User
+from config import settings
+
+
+def detached_copy(user: User) -> User:
+    """Копия пользователя вне сессии.
+    Изменения объекта в сессии и откат ее транзакции копию не затрагивают
+    """
+    return User(
+        **{attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+    )
+
+
+@dataclass
+class CacheStats:
+    """Счетчики кеша пользователей"""
+
+    hits: int
+    """Количество обращений, обслуженных из кеша"""
+    misses: int
+    """Количество обращений, ушедших в бд"""
+    size: int
+    """Текущее количество пользователей в кеше"""
+    max_size: int
+    """Максимальное количество пользователей в кеше"""
+
+
+class UserCache:
+    """Кеш пользователей в памяти процесса по tg_id.
+    - Ограничен по размеру (вытесняются давно не использованные записи)
+    - Записи устаревают через ttl секунд
+    - Списки всех и доверенных пользователей кешируются отдельно
+    и сбрасываются при любом изменении пользователей
+    - Хранятся копии вне сессии, общие для всех читателей: их нельзя изменять
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self._max_size: int = max_size
+        self._ttl: float = ttl
+        self._users: OrderedDict[int, tuple[float, User]] = OrderedDict()
+        """tg_id -> (время устаревания, пользователь)"""
+        self._lists: dict[str, tuple[float, tuple[User, ...]]] = {}
+        """Кешированные списки пользователей: all, trusted"""
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, tg_id: int) -> User | None:
+        """Возвращает пользователя из кеша или None, если его нет или он устарел"""
+        entry = self._users.get(tg_id)
+        if entry is None or entry[0] < monotonic():
+            if entry is not None:
+                del self._users[tg_id]
+            self.misses += 1
+            return None
+        self._users.move_to_end(tg_id)
+        self.hits += 1
+        return entry[1]
+
+    def get_many(self, tg_ids: Iterable[int]) -> tuple[dict[int, User], set[int]]:
+        """Возвращает найденных в кеше пользователей и tg_id, которых в кеше нет"""
+        found: dict[int, User] = {}
+        missing: set[int] = set()
+        for tg_id in set(tg_ids):
+            user: User | None = self.get(tg_id)
+            if user is None:
+                missing.add(tg_id)
+            else:
+                found[tg_id] = user
+        return found, missing
+
+    def put(self, user: User) -> User:
+        """Добавляет или обновляет пользователя в кеше
+        Returns:
+            User: Закешированная копия пользователя вне сессии
+        """
+        copy: User = detached_copy(user)
+        if self._max_size <= 0:
+            return copy
+        self._users[copy.tg_id] = (monotonic() + self._ttl, copy)
+        self._users.move_to_end(copy.tg_id)
+        while len(self._users) > self._max_size:
+            self._users.popitem(last=False)
+        return copy
+
+    def put_many(self, users: Iterable[User]) -> list[User]:
+        """Добавляет или обновляет пользователей в кеше
+        Returns:
+            list[User]: Закешированные копии пользователей вне сессии
+        """
+        return [self.put(user) for user in users]
+
+    def get_list(self, key: str) -> tuple[User, ...] | None:
+        """Возвращает кешированный список пользователей (all, trusted)"""
+        entry = self._lists.get(key)
+        if entry is None or entry[0] < monotonic():
+            self._lists.pop(key, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put_list(self, key: str, users: Sequence[User]) -> tuple[User, ...]:
+        """Кеширует список пользователей и самих пользователей по tg_id
+        Returns:
+            tuple[User, ...]: Закешированные копии пользователей вне сессии
+        """
+        copies: tuple[User, ...] = tuple(self.put_many(users))
+        self._lists[key] = (monotonic() + self._ttl, copies)
+        return copies
+
+    def update(self, user: User) -> User:
+        """Сквозная запись: обновляет пользователя и сбрасывает списки
+        Returns:
+            User: Закешированная копия пользователя вне сессии
+        """
+        self._lists.clear()
+        return self.put(user)
+
+    def invalidate(self, tg_id: int | None = None) -> None:
+        """Сбрасывает пользователя по tg_id или весь кеш, если tg_id не указан"""
+        if tg_id is None:
+            self._users.clear()
+        else:
+            self._users.pop(tg_id, None)
+        self._lists.clear()
+
+    def stats(self) -> CacheStats:
+        """Возвращает счетчики кеша"""
+        return CacheStats(
+            hits=self.hits,
+            misses=self.misses,
+            size=len(self._users),
+            max_size=self._max_size,
+        )
+
+
+# Экземпляр для импорта в других частях проекта
+user_cache = UserCache(
+    max_size=settings.user_cache_size, ttl=settings.user_cache_ttl
+)
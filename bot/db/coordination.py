@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from bot.db.database import engine
+
+
+@asynccontextmanager
+async def advisory_lock(key: int) -> AsyncIterator[None]:
+    """Блокировка на все процессы бота (pg_advisory_xact_lock).
+    Держится в отдельной транзакции и снимается при ее завершении,
+    поэтому не остается висеть на соединении в пуле
+    Args:
+        key (int): Ключ блокировки, общий для всех процессов
+    """
+    async with engine.begin() as conn:
+        await conn.execute(select(func.pg_advisory_xact_lock(key)))
+        yield
+
+
+async def notify(channel: str, payload: str) -> None:
+    """Отправляет уведомление всем процессам, которые слушают канал (NOTIFY)"""
+    async with engine.begin() as conn:
+        await conn.execute(select(func.pg_notify(channel, payload)))
+
+
+class Listener:
+    """Подписка на уведомления Postgres (LISTEN) на выделенном соединении.
+    - Разрыв соединения обнаруживается сразу (termination listener)
+    или проверкой раз в check_interval секунд
+    - После разрыва соединение открывается заново, затем вызывается on_reconnect:
+    уведомления, пришедшие без соединения, потеряны, нужна полная синхронизация
+    """
+
+    def __init__(
+        self,
+        channel: str,
+        callback: Callable[[str], None],
+        on_reconnect: Callable[[], None] | None = None,
+        check_interval: float = 30.0,
+    ) -> None:
+        """
+        Args:
+            channel (str): Канал уведомлений
+            callback (Callable[[str], None]): Синхронная функция callback(payload: str)
+            on_reconnect (Callable[[], None] | None, optional): Синхронная функция,
+            вызывается после восстановления соединения
+            check_interval (float, optional): Период проверки соединения в секундах
+        """
+        self.channel: str = channel
+        self.callback: Callable[[str], None] = callback
+        self.on_reconnect: Callable[[], None] | None = on_reconnect
+        self.check_interval: float = check_interval
+        self._conn: AsyncConnection | None = None
+        self._driver_connection: Any = None
+        self._lost = asyncio.Event()
+        self._watch_task: asyncio.Task | None = None
+
+    def _on_notification(self, connection: Any, pid: int, channel: str, payload: str):
+        try:
+            self.callback(payload)
+        except Exception as e:
+            logging.error(e)
+
+    def _on_termination(self, connection: Any) -> None:
+        if connection is self._driver_connection:
+            self._lost.set()
+
+    async def start(self) -> None:
+        """Занимает соединение из пула и начинает слушать канал"""
+        if self._watch_task is not None:
+            return
+        await self._connect()
+        self._watch_task = asyncio.create_task(self._watch())
+
+    async def _connect(self) -> None:
+        self._lost.clear()
+        self._conn = await engine.connect()
+        raw = await self._conn.get_raw_connection()
+        self._driver_connection = raw.driver_connection
+        self._driver_connection.add_termination_listener(self._on_termination)
+        await self._driver_connection.add_listener(self.channel, self._on_notification)
+        logging.info(f"Listening to {self.channel} notifications")
+
+    async def _disconnect(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._driver_connection.remove_termination_listener(self._on_termination)
+            await self._driver_connection.remove_listener(
+                self.channel, self._on_notification
+            )
+        except Exception as e:
+            logging.error(e)
+        try:
+            await self._conn.close()
+        except Exception as e:
+            logging.error(e)
+        self._conn = None
+        self._driver_connection = None
+
+    async def _alive(self) -> bool:
+        if self._lost.is_set() or self._driver_connection is None:
+            return False
+        try:
+            await self._driver_connection.fetchval("SELECT 1")
+            return True
+        except Exception as e:
+            logging.error(e)
+            return False
+
+    async def _watch(self) -> None:
+        """Следит за соединением и восстанавливает его после разрыва"""
+        while True:
+            try:
+                await asyncio.wait_for(self._lost.wait(), self.check_interval)
+            except asyncio.TimeoutError:
+                pass
+            if await self._alive():
+                continue
+            logging.error(f"{self.channel} listener connection lost, reconnecting")
+            await self._disconnect()
+            delay: float = 1.0
+            while self._conn is None:
+                try:
+                    await self._connect()
+                except Exception as e:
+                    logging.error(e)
+                    await self._disconnect()
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.check_interval)
+            if self.on_reconnect is not None:
+                try:
+                    self.on_reconnect()
+                except Exception as e:
+                    logging.error(e)
+
+    async def stop(self) -> None:
+        """Перестает слушать канал и возвращает соединение в пул"""
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+        await self._disconnect()
@@ -1,7 +1,20 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
 from functools import wraps
-from typing import Awaitable, Callable, Concatenate, ParamSpec, TypeVar
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Concatenate,
+    Iterator,
+    ParamSpec,
+    TypeVar,
+)
 
-from sqlalchemy import Integer
+from sqlalchemy import Integer, make_url
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import (
     AsyncAttrs,
@@ -12,11 +25,27 @@ from sqlalchemy.ext.asyncio import (
 from sqlalchemy.ext.asyncio.engine import AsyncEngine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
+from bot.db.pool import InstrumentedPool, pool_metrics
 from config import settings
 
-engine: AsyncEngine = create_async_engine(url=settings.db_url)
+engine: AsyncEngine = create_async_engine(
+    url=make_url(settings.db_url).update_query_dict(
+        # Кеш подготовленных выражений asyncpg на каждое соединение
+        {"prepared_statement_cache_size": str(settings.db_statement_cache_size)}
+    ),
+    poolclass=InstrumentedPool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+)
+pool_metrics.attach(engine.sync_engine)
 async_session: async_sessionmaker[AsyncSession] = async_sessionmaker(
-    engine, class_=AsyncSession
+    # Объекты живут в кешах дольше сессии, поэтому не сбрасываются при коммите
+    engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
 )
 
 
@@ -30,11 +59,132 @@ P = ParamSpec("P")
 R = TypeVar("R")
 
 
+@dataclass
+class UnitOfWork:
+    """Одна сессия и одна транзакция на обработку апдейта"""
+
+    session: AsyncSession
+    task: asyncio.Task | None
+    """Задача, которой принадлежит сессия. Фоновые задачи копируют контекст,
+    но не должны использовать чужую сессию"""
+    active: bool = True
+    failed: bool = False
+    """Была ли ошибка бд: тогда в конце выполняется откат вместо коммита"""
+    after_commit: list[Callable[[], object]] = field(default_factory=list)
+    """Действия, которые выполняются только после успешного коммита"""
+
+
+_unit_of_work: ContextVar[UnitOfWork | None] = ContextVar(
+    "unit_of_work", default=None
+)
+
+
+def _current_unit_of_work() -> UnitOfWork | None:
+    """Возвращает unit of work текущей задачи, если он открыт"""
+    uow: UnitOfWork | None = _unit_of_work.get()
+    if uow is None or not uow.active or uow.task is not asyncio.current_task():
+        return None
+    return uow
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[AsyncSession]:
+    """Открывает одну сессию, которую переиспользуют все вызовы репозитория
+    внутри блока. Коммит выполняется один раз в конце, при ошибке — откат.
+    Если unit of work уже открыт в этой задаче, используется он
+    """
+    current: UnitOfWork | None = _current_unit_of_work()
+    if current is not None:
+        yield current.session
+        return
+
+    async with async_session() as session:
+        uow = UnitOfWork(session=session, task=asyncio.current_task())
+        token = _unit_of_work.set(uow)
+        try:
+            yield session
+            if uow.failed:
+                await _discard(session)
+                return
+            await session.commit()
+            for callback in uow.after_commit:
+                try:
+                    callback()
+                except Exception as e:
+                    logging.error(e)
+
+        except BaseException:
+            await _discard(session)
+            raise
+
+        finally:
+            uow.active = False
+            _unit_of_work.reset(token)
+
+
+@contextmanager
+def outside_unit_of_work() -> Iterator[None]:
+    """Временно отключает unit of work текущей задачи.
+    Вызовы репозитория внутри блока открывают свои сессии и коммитят сразу
+    """
+    token = _unit_of_work.set(None)
+    try:
+        yield
+    finally:
+        _unit_of_work.reset(token)
+
+
+async def _discard(session: AsyncSession) -> None:
+    """Откатывает транзакцию, не трогая объекты, которые уже попали в кеши"""
+    # Без expunge откат пометил бы загруженные объекты устаревшими
+    session.expunge_all()
+    await session.rollback()
+
+
+async def commit(session: AsyncSession) -> None:
+    """Фиксирует изменения репозитория.
+    Внутри unit of work только отправляет их в бд, коммит будет в конце
+    """
+    uow: UnitOfWork | None = _current_unit_of_work()
+    if uow is not None and uow.session is session:
+        await session.flush()
+    else:
+        await session.commit()
+
+
+async def rollback(session: AsyncSession) -> None:
+    """Откатывает изменения репозитория.
+    Внутри unit of work откатывается вся транзакция апдейта: следующие запросы
+    выполняются в новой транзакции, но в конце ничего не коммитится
+    """
+    uow: UnitOfWork | None = _current_unit_of_work()
+    if uow is not None and uow.session is session:
+        uow.failed = True
+        uow.after_commit.clear()
+        await _discard(session)
+    else:
+        await session.rollback()
+
+
+def on_commit(callback: Callable[[], object]) -> None:
+    """Выполняет действие после коммита: сразу или в конце unit of work"""
+    uow: UnitOfWork | None = _current_unit_of_work()
+    if uow is None:
+        callback()
+    else:
+        uow.after_commit.append(callback)
+
+
 def connection(
     func: Callable[Concatenate["AsyncSession", P], Awaitable[R]],
 ) -> Callable[P, Awaitable[R]]:
     @wraps(func)
     async def wrapper(*args, **kwargs) -> R:
+        uow: UnitOfWork | None = _current_unit_of_work()
+        if uow is not None:
+            # Сессию закрывает и коммитит unit of work
+            return await func(uow.session, *args, **kwargs)
+
         async with async_session() as session:
             try:
                 return await func(session, *args, **kwargs)
@@ -0,0 +1,152 @@
+import logging
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from bot.db.database import AsyncSession, commit, connection, rollback
+from bot.db.models import FsmState
+
+
+@connection
+async def get_fsm_record(
+    session: AsyncSession, key: str
+) -> tuple[str | None, dict[str, Any]] | None:
+    """Получает состояние и данные FSM одним запросом по индексу ключа
+    Args:
+        session (AsyncSession): Объект сессии
+        key (str): Ключ хранилища
+    Returns:
+        tuple[str | None, dict[str, Any]] | None: Состояние и данные
+        или None, если записи нет или она устарела
+    Raises:
+        Exception: Ошибка бд пробрасывается: иначе состояние пользователя
+        молча сбросилось бы
+    """
+    try:
+        row = (
+            await session.execute(
+                select(FsmState.state, FsmState.data).where(
+                    FsmState.key == key, FsmState.expires_at > func.now()
+                )
+            )
+        ).one_or_none()
+        if row is None:
+            return None
+        return row.state, row.data
+
+    except Exception as e:
+        logging.error(e)
+        await rollback(session)
+        raise
+
+
+def _alive(column: Any, fresh: Any) -> Any:
+    """Значение колонки существующей записи, или fresh, если запись устарела"""
+    return case((FsmState.expires_at > func.now(), column), else_=fresh)
+
+
+@connection
+async def set_fsm_state(
+    session: AsyncSession, key: str, state: str | None, expires_at: datetime
+) -> None:
+    """Устанавливает состояние FSM и продлевает запись
+    - Сброс состояния не создает новую запись
+    Args:
+        session (AsyncSession): Объект сессии
+        key (str): Ключ хранилища
+        state (str | None): Новое состояние, None — сбросить
+        expires_at (datetime): Когда запись устареет
+    """
+    try:
+        if state is None:
+            await session.execute(
+                update(FsmState)
+                .where(FsmState.key == key)
+                .values(state=None, expires_at=expires_at)
+            )
+        else:
+            stmt = pg_insert(FsmState).values(
+                key=key, state=state, data={}, expires_at=expires_at
+            )
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[FsmState.key],
+                    set_={
+                        "state": stmt.excluded.state,
+                        # Данные устаревшей записи не переносятся в новое состояние
+                        "data": _alive(FsmState.data, stmt.excluded.data),
+                        "expires_at": stmt.excluded.expires_at,
+                    },
+                )
+            )
+        await commit(session)
+
+    except Exception as e:
+        logging.error(e)
+        await rollback(session)
+
+
+@connection
+async def set_fsm_data(
+    session: AsyncSession, key: str, data: dict[str, Any], expires_at: datetime
+) -> None:
+    """Заменяет данные FSM и продлевает запись
+    - Очистка данных не создает новую запись
+    Args:
+        session (AsyncSession): Объект сессии
+        key (str): Ключ хранилища
+        data (dict[str, Any]): Новые данные (сериализуемые в json)
+        expires_at (datetime): Когда запись устареет
+    """
+    try:
+        if not data:
+            await session.execute(
+                update(FsmState)
+                .where(FsmState.key == key)
+                .values(data={}, expires_at=expires_at)
+            )
+        else:
+            stmt = pg_insert(FsmState).values(
+                key=key, state=None, data=data, expires_at=expires_at
+            )
+            await session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[FsmState.key],
+                    set_={
+                        "state": _alive(FsmState.state, stmt.excluded.state),
+                        "data": stmt.excluded.data,
+                        "expires_at": stmt.excluded.expires_at,
+                    },
+                )
+            )
+        await commit(session)
+
+    except Exception as e:
+        logging.error(e)
+        await rollback(session)
+
+
+@connection
+async def delete_expired_fsm_states(session: AsyncSession) -> int:
+    """Удаляет устаревшие и пустые записи FSM
+    Args:
+        session (AsyncSession): Объект сессии
+    Returns:
+        int: Количество удаленных записей
+    """
+    try:
+        result = await session.execute(
+            delete(FsmState).where(
+                (FsmState.expires_at <= func.now())
+                | (FsmState.state.is_(None) & (FsmState.data == {}))
+            )
+        )
+        await commit(session)
+        return result.rowcount  # type: ignore
+
+    except Exception as e:
+        logging.error(e)
+        await rollback(session)
+        return 0
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import (
+    BaseStorage,
+    DefaultKeyBuilder,
+    KeyBuilder,
+    StateType,
+    StorageKey,
+)
+
+from bot.db.fsm_repository import (
+    delete_expired_fsm_states,
+    get_fsm_record,
+    set_fsm_data,
+    set_fsm_state,
+)
+
+
+class DbStorage(BaseStorage):
+    """Хранилище FSM в Postgres (таблица fsm_states).
+    - Состояние переживает перезапуск и общее для нескольких процессов
+    - Состояние и данные читаются одним запросом по уникальному ключу
+    - Запись устаревает через ttl секунд после последнего изменения
+    """
+
+    def __init__(self, ttl: float, key_builder: KeyBuilder | None = None) -> None:
+        self.ttl: float = ttl
+        self.key_builder: KeyBuilder = key_builder or DefaultKeyBuilder()
+
+    def _expires_at(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value: str | None = state.state if isinstance(state, State) else state
+        await set_fsm_state(self.key_builder.build(key), value, self._expires_at())
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        record = await get_fsm_record(self.key_builder.build(key))
+        return None if record is None else record[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await set_fsm_data(self.key_builder.build(key), dict(data), self._expires_at())
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        record = await get_fsm_record(self.key_builder.build(key))
+        return dict() if record is None else dict(record[1])
+
+    async def purge_expired(self) -> int:
+        """Удаляет устаревшие и пустые состояния"""
+        return await delete_expired_fsm_states()
+
+    async def close(self) -> None:
+        # Соединениями управляет общий движок бд
+        pass
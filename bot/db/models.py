@@ -1,5 +1,17 @@
-from sqlalchemy import BigInteger, Boolean, String
-from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from bot.db.database import Base
 
@@ -23,3 +35,64 @@ class User(Base):
 
     def __repr__(self) -> str:
         return f"<User(id={self.id}, tg_id={self.tg_id}, username='{self.username}', name='{self.name}', has_desire='{self.has_desire}', trusted='{self.trusted}')>"
+
+
+class StoredQueue(Base):
+    """Модель сохраненной очереди"""
+
+    __tablename__ = "queues"
+
+    name: Mapped[str] = mapped_column(String, unique=True, nullable=False)
+    """Название очереди, по которому к ней обращаются команды"""
+    is_current: Mapped[bool] = mapped_column(Boolean, default=False)
+    """Является ли очередь текущей"""
+    members: Mapped[list["QueueMember"]] = relationship(
+        order_by="QueueMember.position",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="selectin",
+    )
+    """Участники очереди по порядку"""
+
+    def __repr__(self) -> str:
+        return f"<StoredQueue(id={self.id}, name='{self.name}', is_current='{self.is_current}')>"
+
+
+class QueueMember(Base):
+    """Модель участника очереди (позиция пользователя в очереди)"""
+
+    __tablename__ = "queue_members"
+    __table_args__ = (
+        # Уникальность позиции не проверяется: сдвиг меняет все позиции одним UPDATE
+        Index("ix_queue_members_queue_id_position", "queue_id", "position"),
+    )
+
+    queue_id: Mapped[int] = mapped_column(
+        ForeignKey("queues.id", ondelete="CASCADE"), nullable=False
+    )
+    """Id очереди"""
+    position: Mapped[int] = mapped_column(Integer, nullable=False)
+    """Позиция в очереди, начиная с 0"""
+    tg_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    """Id, привязанный к телеграмм аккаунту участника"""
+
+    def __repr__(self) -> str:
+        return f"<QueueMember(queue_id={self.queue_id}, position={self.position}, tg_id={self.tg_id})>"
+
+
+class FsmState(Base):
+    """Модель состояния FSM (машины состояний aiogram) одного чата"""
+
+    __tablename__ = "fsm_states"
+
+    key: Mapped[str] = mapped_column(String, unique=True, nullable=False)
+    """Ключ хранилища (бот, чат, пользователь), по нему ищется состояние"""
+    state: Mapped[str | None] = mapped_column(String, nullable=True)
+    """Текущее состояние, например Register:entering_name"""
+    data: Mapped[dict[str, Any]] = mapped_column(JSONB, nullable=False, default=dict)
+    """Данные состояния"""
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    """Когда состояние устаревает и перестает учитываться"""
+
+    def __repr__(self) -> str:
+        return f"<FsmState(key='{self.key}', state='{self.state}', expires_at='{self.expires_at}')>"
@@ -0,0 +1,116 @@
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Any
+
+from sqlalchemy import Engine, event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, QueuePool
+from sqlalchemy.util.queue import AsyncAdaptedQueue, Empty
+
+
+@dataclass
+class PoolStats:
+    """Снимок метрик пула соединений"""
+
+    size: int
+    """Настроенный размер пула"""
+    checked_out: int
+    """Соединений выдано сейчас"""
+    overflow: int
+    """Соединений сверх размера пула сейчас"""
+    checkouts: int
+    """Всего выдач соединений"""
+    overflow_checkouts: int
+    """Выдач, потребовавших соединение сверх размера пула"""
+    timeouts: int
+    """Сколько раз соединение не дождались за pool_timeout"""
+    connects: int
+    """Сколько новых соединений открыто"""
+    invalidations: int
+    """Сколько соединений признано нерабочими (в том числе pre-ping)"""
+    avg_wait_ms: float
+    """Среднее ожидание свободного соединения в очереди пула, мс
+    (без времени открытия новых соединений)"""
+    max_wait_ms: float
+    """Максимальное ожидание свободного соединения в очереди пула, мс"""
+
+
+class PoolMetrics:
+    """Счетчики пула соединений, собираются событиями SQLAlchemy"""
+
+    def __init__(self) -> None:
+        self.checkouts: int = 0
+        self.overflow_checkouts: int = 0
+        self.timeouts: int = 0
+        self.connects: int = 0
+        self.invalidations: int = 0
+        self.total_wait: float = 0.0
+        self.max_wait: float = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+
+    def attach(self, engine: Engine) -> None:
+        """Подписывается на события пула движка (переживают пересоздание пула)"""
+
+        @event.listens_for(engine, "connect")
+        def on_connect(*args: Any) -> None:
+            self.connects += 1
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(*args: Any) -> None:
+            self.checkouts += 1
+            pool = engine.pool
+            if isinstance(pool, QueuePool) and pool.overflow() > 0:
+                self.overflow_checkouts += 1
+
+        @event.listens_for(engine, "invalidate")
+        def on_invalidate(*args: Any) -> None:
+            self.invalidations += 1
+
+    def stats(self, pool: Any) -> PoolStats:
+        """Возвращает метрики вместе с текущим состоянием пула"""
+        return PoolStats(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            checkouts=self.checkouts,
+            overflow_checkouts=self.overflow_checkouts,
+            timeouts=self.timeouts,
+            connects=self.connects,
+            invalidations=self.invalidations,
+            avg_wait_ms=(
+                self.total_wait / self.checkouts * 1000 if self.checkouts else 0.0
+            ),
+            max_wait_ms=self.max_wait * 1000,
+        )
+
+
+pool_metrics = PoolMetrics()
+
+
+class WaitTimedQueue(AsyncAdaptedQueue[ConnectionPoolEntry]):
+    """Очередь свободных соединений пула, которая замеряет только ожидание в ней.
+    Пул ждет в очереди, лишь когда исчерпан max_overflow, поэтому пустая очередь
+    при ожидании означает таймаут пула
+    """
+
+    def get(
+        self, block: bool = True, timeout: float | None = None
+    ) -> ConnectionPoolEntry:
+        if not block:
+            return super().get(block, timeout)
+        started: float = perf_counter()
+        try:
+            return super().get(block, timeout)
+        except Empty:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.record_wait(perf_counter() - started)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул соединений, который замеряет ожидание свободного соединения"""
+
+    _queue_class = WaitTimedQueue
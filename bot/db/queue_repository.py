@@ -0,0 +1,148 @@
+import logging
+from typing import Any, Iterable, Sequence
+
+from sqlalchemy import case, delete, func, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from bot.db.database import AsyncSession, commit, connection, rollback
+from bot.db.models import QueueMember, StoredQueue
+
+
+@connection
+async def get_stored_queues(
+    session: AsyncSession, names: Iterable[str] | None = None
+) -> Sequence[StoredQueue] | None:
+    """Получает очереди с участниками из бд
+    Args:
+        session (AsyncSession): Объект сессии
+        names (Iterable[str] | None, optional): Названия нужных очередей,
+        текущая очередь возвращается всегда. Defaults to None — все очереди
+    Returns:
+        Sequence[StoredQueue] | None: Очереди, участники каждой отсортированы по позиции.
+        None при ошибке бд (в отличие от пустого списка — "очередей нет")
+    """
+    query = select(StoredQueue).order_by(StoredQueue.id)
+    if names is not None:
+        query = query.where(
+            or_(StoredQueue.name.in_(list(names)), StoredQueue.is_current)
+        )
+    try:
+        queues: Sequence[StoredQueue] = (await session.scalars(query)).all()
+        return queues
+
+    except Exception as e:
+        logging.error(e)
+        await rollback(session)
+        return None
+
+
+def _queue_id(name: str):
+    """Подзапрос id очереди по названию"""
+    return select(StoredQueue.id).where(StoredQueue.name == name).scalar_subquery()
+
+
+async def _set_queue(session: AsyncSession, name: str, tg_ids: list[int]) -> None:
+    """Создает очередь или полностью заменяет ее участников"""
+    queue_id: int = await session.scalar(
+        pg_insert(StoredQueue)
+        .values(name=name, is_current=False)
+        .on_conflict_do_update(index_elements=[StoredQueue.name], set_={"name": name})
+        .returning(StoredQueue.id)
+    )  # type: ignore
+    await session.execute(
+        delete(QueueMember).where(QueueMember.queue_id == queue_id)
+    )
+    if tg_ids:
+        await session.execute(
+            insert(QueueMember),
+            [
+                {"queue_id": queue_id, "position": position, "tg_id": tg_id}
+                for position, tg_id in enumerate(tg_ids)
+            ],
+        )
+
+
+async def _move_queue(session: AsyncSession, name: str, steps: int) -> None:
+    """Циклический сдвиг очереди одним UPDATE: первый становится последним"""
+    queue_id = _queue_id(name)
+    size = (
+        select(func.count())
+        .select_from(QueueMember)
+        .where(QueueMember.queue_id == queue_id)
+        .scalar_subquery()
+    )
+    await session.execute(
+        update(QueueMember)
+        .where(QueueMember.queue_id == queue_id)
+        .values(position=((QueueMember.position - steps) % size + size) % size)
+    )
+
+
+async def _replace_member(
+    session: AsyncSession, name: str, hwo: int, where: int
+) -> None:
+    """Перемещает участника с позиции hwo на позицию where одним UPDATE.
+    Позиции должны быть уже нормализованы (без отрицательных и выходящих за границы)
+    """
+    if hwo == where:
+        return
+    if hwo < where:
+        low, high, shift = hwo, where, -1
+    else:
+        low, high, shift = where, hwo, 1
+    await session.execute(
+        update(QueueMember)
+        .where(
+            QueueMember.queue_id == _queue_id(name),
+            QueueMember.position.between(low, high),
+        )
+        .values(
+            position=case(
+                (QueueMember.position == hwo, where),
+                else_=QueueMember.position + shift,
+            )
+        )
+    )
+
+
+@connection
+async def apply_queue_ops(session: AsyncSession, ops: list[dict[str, Any]]) -> bool:
+    """Применяет изменения очередей в одной транзакции
+    - set: {"name", "queue"} — создать очередь или заменить участников
+    - delete: {"name"} — удалить очередь
+    - move: {"name", "steps"} — циклический сдвиг
+    - replace: {"name", "hwo", "where"} — переместить участника
+    - current: {"name"} — сделать очередь текущей (None — ни одной)
+    Args:
+        session (AsyncSession): Объект сессии
+        ops (list[dict[str, Any]]): Изменения по порядку, в формате журнала очередей
+    Returns:
+        bool: Удалось ли применить изменения
+    """
+    try:
+        for record in ops:
+            op = record["op"]
+            name = record["name"]
+            if op == "set":
+                await _set_queue(session, name, record["queue"])
+            elif op == "delete":
+                await session.execute(
+                    delete(StoredQueue).where(StoredQueue.name == name)
+                )
+            elif op == "move":
+                await _move_queue(session, name, record["steps"])
+            elif op == "replace":
+                await _replace_member(session, name, record["hwo"], record["where"])
+            elif op == "current":
+                await session.execute(
+                    update(StoredQueue).values(is_current=StoredQueue.name == name)
+                )
+            else:
+                logging.error(f"Unknown queue op: {record}")
+        await commit(session)
+        return True
+
+    except Exception as e:
+        logging.error(e)
+        await rollback(session)
+        return False
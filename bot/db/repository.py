@@ -1,14 +1,67 @@
 import logging
-from typing import Sequence
+from typing import Any, Callable, Iterable, Sequence
 
-from sqlalchemy import select
+from sqlalchemy import Boolean, literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from bot.db.database import AsyncSession, connection
+from bot.db.cache import user_cache
+from bot.db.database import AsyncSession, commit, connection, on_commit, rollback
 from bot.db.models import User
 
+_user_listeners: list[Callable[[User], None]] = []
+"""Подписчики на изменения пользователей (создание, обновление)"""
+
+
+def subscribe_user_updates(listener: Callable[[User], None]) -> None:
+    """Подписывает функцию на изменения пользователей.
+    Функция вызывается с обновленным пользователем после каждой записи в бд
+    Args:
+        listener (Callable[[User], None]): Синхронная функция listener(user: User)
+    """
+    _user_listeners.append(listener)
+
+
+def _publish_user(user: User) -> User:
+    """Записывает пользователя в кеш и оповещает подписчиков.
+    Подписчики получают копию из кеша, а не объект сессии
+    Returns:
+        User: Копия пользователя из кеша
+    """
+    user = user_cache.update(user)
+    for listener in _user_listeners:
+        try:
+            listener(user)
+        except Exception as e:
+            logging.error(e)
+    return user
+
+
+def _user_written(user: User) -> None:
+    """Сквозная запись в кеш пользователей и оповещение подписчиков.
+    До коммита пользователь только убирается из кеша"""
+    user_cache.invalidate(user.tg_id)
+    on_commit(lambda: _publish_user(user))
+
+
+async def get_user(tg_id: int) -> User | None:
+    """Получает пользователя из кеша или из бд
+    Args:
+        tg_id (int): Id, привязанный к телеграмм аккаунту
+    Returns:
+        User: Пользователь
+    """
+    user: User | None = user_cache.get(tg_id)
+    if user is not None:
+        return user
+    user = await _select_user(tg_id)
+    if user is not None:
+        # Объект сессии не отдается: его изменения до коммита попали бы в кеш
+        user = user_cache.put(user)
+    return user
+
 
 @connection
-async def get_user(session: AsyncSession, tg_id: int) -> User | None:
+async def _select_user(session: AsyncSession, tg_id: int) -> User | None:
     """Получает пользователя из бд
     Args:
         session (AsyncSession): Объект сессии
@@ -21,9 +74,68 @@ async def get_user(session: AsyncSession, tg_id: int) -> User | None:
         return user
     except Exception as e:
         logging.error(e)
+        await rollback(session)
         return None
 
 
+async def get_users_by_tg_ids(tg_ids: Iterable[int]) -> dict[int, User]:
+    """Получает пользователей из кеша, недостающих — из бд одним запросом
+    - Порядок не гарантируется, поэтому возвращается словарь по tg_id
+    Args:
+        tg_ids (Iterable[int]): Id, привязанные к телеграмм аккаунтам
+    Returns:
+        dict[int, User]: Найденные пользователи по tg_id
+    """
+    users, missing = user_cache.get_many(tg_ids)
+    if missing:
+        loaded: dict[int, User] = await _select_users_by_tg_ids(missing)
+        users.update(
+            (user.tg_id, user) for user in user_cache.put_many(loaded.values())
+        )
+    return users
+
+
+async def reload_users(tg_ids: Iterable[int]) -> dict[int, User]:
+    """Перечитывает пользователей из бд мимо кеша и оповещает подписчиков.
+    Нужна, когда пользователей изменил другой процесс бота
+    Args:
+        tg_ids (Iterable[int]): Id, привязанные к телеграмм аккаунтам
+    Returns:
+        dict[int, User]: Найденные пользователи по tg_id
+    """
+    ids: set[int] = set(tg_ids)
+    for tg_id in ids:
+        user_cache.invalidate(tg_id)
+    users: dict[int, User] = await _select_users_by_tg_ids(ids)
+    return {tg_id: _publish_user(user) for tg_id, user in users.items()}
+
+
+@connection
+async def _select_users_by_tg_ids(
+    session: AsyncSession, tg_ids: Iterable[int]
+) -> dict[int, User]:
+    """Получает пользователей из бд одним запросом (WHERE tg_id IN (...))
+    Args:
+        session (AsyncSession): Объект сессии
+        tg_ids (Iterable[int]): Id, привязанные к телеграмм аккаунтам
+    Returns:
+        dict[int, User]: Найденные пользователи по tg_id
+    """
+    ids: set[int] = set(tg_ids)
+    if not ids:
+        return dict()
+    try:
+        users: Sequence[User] = (
+            await session.scalars(select(User).where(User.tg_id.in_(ids)))
+        ).all()
+        return {user.tg_id: user for user in users}
+
+    except Exception as e:
+        logging.error(e)
+        await rollback(session)
+        return dict()
+
+
 @connection
 async def create_user(
     session: AsyncSession,
@@ -34,6 +146,8 @@ async def create_user(
 ) -> User | None:
     """Создает, добавляет пользователя в бд, если такого нет.
     Возвращает пользователя, если найден или None, если создан
+    - Один запрос INSERT ... ON CONFLICT (tg_id) DO UPDATE ... RETURNING,
+    поэтому повторный /start не приводит к нарушению уникальности
     Args:
         session (AsyncSession): Объект сессии
         tg_id (int): Id, привязанный к телеграмм аккаунту
@@ -42,33 +156,54 @@ async def create_user(
     Returns:
         User: Найденный пользователь
     """
+    values: dict[str, Any] = {"tg_id": tg_id}
+    if username is not None:
+        values["username"] = username
+    if name is not None:
+        values["name"] = name
+    if trusted is not None:
+        values["trusted"] = trusted
+
+    insert_stmt = pg_insert(User).values(**values)
+    upsert = (
+        # Существующего пользователя не меняем: обновление только ради RETURNING
+        insert_stmt.on_conflict_do_update(
+            index_elements=[User.tg_id], set_={"tg_id": insert_stmt.excluded.tg_id}
+        )
+        # xmax = 0 только у строки, вставленной этим запросом
+        .returning(User, literal_column("xmax = 0", Boolean).label("inserted"))
+        .execution_options(populate_existing=True)
+    )
     try:
-        user: User | None = await session.scalar(select(User).filter_by(tg_id=tg_id))
-        if user is not None:
+        user, inserted = (await session.execute(upsert)).one()
+        await commit(session)
+        if not inserted:
             logging.info(f"User already exists {tg_id} @{user.username} {user.name}")
-            await session.commit()
-            await session.refresh(user)
-            return user
-
-        new_user = User(tg_id=tg_id)
-        if username is not None:
-            new_user.username = username
-        if name is not None:
-            new_user.name = name
-        if trusted is not None:
-            new_user.trusted = trusted
-        session.add(new_user)
-        await session.commit()
+            return user_cache.put(user)
+
+        _user_written(user)
         logging.info(f"User created {tg_id} @{username}")
         return None
 
     except Exception as e:
         logging.error(e)
+        await rollback(session)
         return None
 
 
+async def get_all_users() -> Sequence[User]:
+    """Получает всех пользователей из кеша или из бд
+    Returns:
+        Sequence[User]: Последовательность из всех пользователей
+    """
+    users: Sequence[User] | None = user_cache.get_list("all")
+    if users is None:
+        users = user_cache.put_list("all", await _select_all_users())
+    return users
+
+
 @connection
-async def get_all_users(session: AsyncSession) -> Sequence[User]:
+async def _select_all_users(session: AsyncSession) -> Sequence[User]:
     """Получает всех пользователей из бд
     Args:
         session (AsyncSession): Объект сессии
@@ -81,11 +216,65 @@ async def get_all_users(session: AsyncSession) -> Sequence[User]:
 
     except Exception as e:
         logging.error(e)
+        await rollback(session)
         return list()
 
 
 @connection
-async def get_all_trusted_users(session: AsyncSession) -> Sequence[User]:
+async def get_users_page(
+    session: AsyncSession,
+    after_id: int | None = None,
+    before_id: int | None = None,
+    limit: int = 20,
+) -> tuple[Sequence[User], bool]:
+    """Получает страницу пользователей по id (keyset-пагинация).
+    Стоимость запроса не зависит от номера страницы и размера таблицы
+    Args:
+        session (AsyncSession): Объект сессии
+        after_id (int | None, optional): Страница после пользователя с этим id. Defaults to None.
+        before_id (int | None, optional): Страница перед пользователем с этим id. Defaults to None.
+        limit (int, optional): Размер страницы. Defaults to 20.
+    Returns:
+        tuple[Sequence[User], bool]: Пользователи по возрастанию id и есть ли еще
+        пользователи в направлении листания
+    """
+    query = select(User)
+    if before_id is not None:
+        query = query.where(User.id < before_id).order_by(User.id.desc())
+    else:
+        if after_id is not None:
+            query = query.where(User.id > after_id)
+        query = query.order_by(User.id)
+    try:
+        # Лишняя запись показывает, что есть следующая страница
+        users: list[User] = list(
+            (await session.scalars(query.limit(limit + 1))).all()
+        )
+        has_more: bool = len(users) > limit
+        users = users[:limit]
+        if before_id is not None:
+            users.reverse()
+        return users, has_more
+
+    except Exception as e:
+        logging.error(e)
+        await rollback(session)
+        return list(), False
+
+
+async def get_all_trusted_users() -> Sequence[User]:
+    """Получает доверенных пользователей из кеша или из бд
+    Returns:
+        Sequence[User]: Последовательность из доверенных пользователей
+    """
+    users: Sequence[User] | None = user_cache.get_list("trusted")
+    if users is None:
+        users = user_cache.put_list("trusted", await _select_all_trusted_users())
+    return users
+
+
+@connection
+async def _select_all_trusted_users(session: AsyncSession) -> Sequence[User]:
     """Получает доверенных пользователей из бд
     Args:
         session (AsyncSession): Объект сессии
@@ -100,6 +289,7 @@ async def get_all_trusted_users(session: AsyncSession) -> Sequence[User]:
 
     except Exception as e:
         logging.error(e)
+        await rollback(session)
         return list()
 
 
@@ -170,12 +360,14 @@ async def update_user(
             user, username=username, name=name, has_desire=has_desire, trusted=trusted
         )
 
-        await session.commit()
+        await commit(session)
         await session.refresh(user)
+        _user_written(user)
         return user
 
     except Exception as e:
         logging.error(e)
+        await rollback(session)
         return None
 
 
@@ -212,10 +404,52 @@ async def update_user_by_id(
             user, username=username, name=name, has_desire=has_desire, trusted=trusted
         )
 
-        await session.commit()
+        await commit(session)
         await session.refresh(user)
+        _user_written(user)
         return user
 
     except Exception as e:
         logging.error(e)
+        await rollback(session)
         return None
+
+
+@connection
+async def update_users_trust_by_ids(
+    session: AsyncSession, user_ids: Iterable[int], trusted: bool
+) -> Sequence[User]:
+    """Меняет доверие сразу нескольким пользователям одним запросом
+    (UPDATE ... WHERE id IN (...) RETURNING ...)
+    - Предназначена для использования в админ-панели
+    Args:
+        session (AsyncSession): Объект сессии
+        user_ids (Iterable[int]): Внутренние id пользователей (row_id, primary key)
+        trusted (bool): Является ли пользователь доверенным
+    Returns:
+        Sequence[User]: Обновленные пользователи, ненайденных id в них нет
+    """
+    ids: set[int] = set(user_ids)
+    if not ids:
+        return list()
+    try:
+        users: Sequence[User] = (
+            await session.scalars(
+                update(User)
+                .where(User.id.in_(ids))
+                .values(trusted=trusted)
+                .returning(User)
+            )
+        ).all()
+        await commit(session)
+        for user in users:
+            logging.info(
+                f"User trust has changed id={user.id} tg_id={user.tg_id} @{user.username}"
+            )
+            _user_written(user)
+        return users
+
+    except Exception as e:
+        logging.error(e)
+        await rollback(session)
+        return list()
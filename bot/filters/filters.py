@@ -1,5 +1,5 @@
 from aiogram.filters import BaseFilter
-from aiogram.types import Message
+from aiogram.types import CallbackQuery, Message
 
 
 class IsAdminFilter(BaseFilter):
@@ -8,7 +8,7 @@ class IsAdminFilter(BaseFilter):
     def __init__(self, admin_ids: list[int]):
         self.admin_ids: list[int] = admin_ids
 
-    async def __call__(self, message: Message) -> bool:
+    async def __call__(self, message: Message | CallbackQuery) -> bool:
         if not message.from_user:
             return False
         return message.from_user.id in self.admin_ids
@@ -1,20 +1,34 @@
-from typing import Sequence
+import logging
 
 from aiogram import F, Router
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.filters.command import CommandObject
-from aiogram.types import Message
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
 
 from bot import keyboards as kb
-from bot.db import User, get_all_users, update_user_by_id
+from bot.db import (
+    User,
+    engine,
+    get_users_page,
+    pool_metrics,
+    update_user_by_id,
+    update_users_trust_by_ids,
+    user_cache,
+)
 from bot.filters import IsAdminFilter
 from bot.utils import queue_manager
-from bot.utils.broadcaster import send, send_queue
-from bot.utils.json_storage import save_bot_settings
+from bot.utils.bot_settings import bot_settings
+from bot.utils.jobs import BroadcastJob, job_manager
+from bot.utils.live_queue import live_queue
+from bot.utils.messages import MESSAGE_LIMIT, answer_long, fitting_count, split_text
+from bot.utils.queue import QueueNotFoundError
+from bot.utils.rendering import RenderStyle, parse_view, render_user_info
 from config import settings
 
 router = Router()
 router.message.filter(IsAdminFilter(admin_ids=settings.admins))
+router.callback_query.filter(IsAdminFilter(admin_ids=settings.admins))
 
 
 @router.message(F.text, Command("admin", "adm"))
@@ -31,9 +45,9 @@ async def admin_panel(message: Message) -> None:
         " • /delete — удалить очередь\n"
         " • /list, /ls — вывести список очередей\n"
         " • /current, /cur — изменить текущую очередь\n"
-        " • /save — сохранить очереди в файл\n\n"
-        "Управление определенной очередью:\n"
-        " • /show, /sh — показать текущую очередь\n"
+        " • /save — сохранить очереди\n\n"
+        "Управление определенной очередью (очередь показывается в закрепленном сообщении, оно обновляется на месте):\n"
+        " • /show, /sh [хотят | топ <N> | я <K>] [очередь] — показать очередь целиком или только ее часть\n"
         " • /shuffle, /shf — перемешать очередь\n"
         " • /next, /nx  — перейти к следующему\n"
         " • /forward, /fwd <steps> — сдвинуть очередь вперед на заданное количество шагов (по умолчанию = 1)\n"
@@ -45,12 +59,15 @@ async def admin_panel(message: Message) -> None:
         " • /users — показать всех пользователей\n"
         " • /send_queue — отправить доверенным пользователям актуальную очередь\n"
         " • /send <message> — отправить сообщение всем доверенным пользователям\n"
+        " • /jobs — статус рассылок\n"
+        " • /cancel_job <id> — отменить рассылку\n"
         " • /rename <id> <new_name> — переименовывает пользователя\n"
         " • /have <id> <bool> — меняет желание пользователя на указанное\n"
         " • /trust <id> — сделать пользователя доверенным\n"
         " • /untrust <id> — не доверять пользователю (он не будет участвовать в очереди)\n\n"
         "Управление ботом:\n"
         " • /trust_new <bool> — изменяет настройку бота - доверять ли новым пользователям (обычно = 1, true)\n"
+        " • /stats — показать статистику кешей и пула соединений бд\n"
     )
     await message.answer(
         text=text, reply_markup=kb.admin.as_markup(resize_keyboard=True)
@@ -63,7 +80,7 @@ async def create_queue(message: Message, command: CommandObject) -> None:
     """Создать очередь"""
     queue_name: str | None = command.args
     text: str = await queue_manager.create_queue(queue_name)
-    await message.answer(text=text)
+    await answer_long(message, text)
 
 
 @router.message(F.text, Command("copy"))
@@ -71,22 +88,22 @@ async def copy_queue(message: Message, command: CommandObject) -> None:
     """Копировать очередь"""
     queue_name: str | None = command.args
     text: str = await queue_manager.copy_queue(queue_name)
-    await message.answer(text=text)
+    await answer_long(message, text)
 
 
 @router.message(F.text, Command("delete"))
 async def delete_queue(message: Message, command: CommandObject) -> None:
     """Удалить очередь"""
     queue_name: str | None = command.args
-    text: str = queue_manager.delete_queue(queue_name=queue_name)
-    await message.answer(text=text)
+    text: str = await queue_manager.delete_queue(queue_name=queue_name)
+    await answer_long(message, text)
 
 
 @router.message(F.text, Command("list", "ls"))
 async def list_queues(message: Message) -> None:
     """Посмотреть все очереди"""
     text: str = queue_manager.get_queue_names()
-    await message.answer(text)
+    await answer_long(message, text)
 
 
 @router.message(F.text, Command("current", "cur"))
@@ -94,20 +111,25 @@ async def set_current_queue(message: Message, command: CommandObject) -> None:
     """Установить текущую очередь"""
     queue_name: str | None = command.args
     text: str = await queue_manager.set_current_queue(queue_name=queue_name)
-    await message.answer(text=text)
+    await answer_long(message, text)
 
 
 @router.message(F.text, Command("save"))
 async def save_queue(message: Message) -> None:
-    """Сохраняет очереди в json файл"""
+    """Сохраняет очереди в хранилище (бд или json файл)"""
     await queue_manager.save_to_file()
     await message.answer("⚙️ Очереди сохранены")
 
 
 @router.message(F.text, Command("load"))
 async def load_queue(message: Message) -> None:
-    """Загружает очереди из json файла"""
-    await queue_manager.load_from_file()
+    """Загружает очереди из хранилища (бд или json файл)"""
+    try:
+        await queue_manager.load_from_file()
+    except RuntimeError as e:
+        logging.error(e)
+        await message.answer("❌ Очереди не загружены: бд недоступна")
+        return
     await message.answer("⚙️ Очереди загружены")
 
 
@@ -115,12 +137,36 @@ async def load_queue(message: Message) -> None:
 
 
 # region Queue management
+async def show_live(message: Message, text: str, queue_name: str | None) -> None:
+    """Показывает текущую очередь в закрепленном сообщении чата вместо нового сообщения.
+    Другие очереди и текст ошибки отправляются обычными сообщениями,
+    чтобы автообновление текущей очереди не перезаписало их"""
+    if not queue_manager.has_queue(queue_name):
+        await message.answer(text=text)
+        return
+    if not queue_manager.is_current_queue(queue_name):
+        await answer_long(message, text)
+        return
+    await live_queue.show(message.chat.id, text)
+
+
 @router.message(F.text, Command("show", "sh"))
 async def queue_show(message: Message, command: CommandObject) -> None:
-    """Возвращает текстовое представление очереди"""
-    queue_name: str | None = command.args
-    text: str = await queue_manager.queue_show(queue_name)
-    await message.answer(text)
+    """Возвращает текстовое представление очереди: /show [вид [N]] [очередь].
+    Полная очередь показывается в закрепленном сообщении, остальные виды — обычным"""
+    style, size, queue_name = parse_view(command.args)
+    tg_id: int | None = message.from_user.id if message.from_user else None
+    try:
+        text: str = await queue_manager.queue_show(
+            queue_name, style=style, size=size, tg_id=tg_id
+        )
+    except QueueNotFoundError as e:
+        await message.answer(text=str(e))
+        return
+    if style is RenderStyle.FULL:
+        await show_live(message, text, queue_name)
+    else:
+        await answer_long(message, text)
 
 
 @router.message(F.text, Command("shuffle", "shf"))
@@ -128,7 +174,7 @@ async def queue_shuffle(message: Message, command: CommandObject) -> None:
     """Перемешивает очередь"""
     queue_name: str | None = command.args
     text: str = await queue_manager.queue_shuffle(queue_name)
-    await message.answer(text)
+    await show_live(message, text, queue_name)
 
 
 @router.message(F.text, Command("next", "nx"))
@@ -136,7 +182,7 @@ async def queue_next_desiring(message: Message, command: CommandObject) -> None:
     """Переходит к следующему желающему в очереди"""
     queue_name: str | None = command.args
     text: str = await queue_manager.queue_next_desiring(queue_name)
-    await message.answer(text)
+    await show_live(message, text, queue_name)
 
 
 @router.message(F.text, Command("forward", "fwd", "backward", "bwd"))
@@ -153,7 +199,7 @@ async def queue_move(message: Message, command: CommandObject) -> None:
         steps = -steps
 
     text: str = await queue_manager.queue_move(queue_name=queue_name, steps=steps)
-    await message.answer(text=text)
+    await show_live(message, text, queue_name)
 
 
 @router.message(F.text, Command("replace"))
@@ -168,8 +214,12 @@ async def queue_replace(message: Message, command: CommandObject) -> None:
         await message.answer("❌ Ошибка: аргументы указаны неверно")
         return
 
-    text: str = await queue_manager.queue_replace(hwo, where)
-    await message.answer(text=text)
+    try:
+        text: str = await queue_manager.queue_replace(hwo, where)
+    except IndexError:
+        await message.answer("❌ Неправильный индекс")
+        return
+    await show_live(message, text, None)
 
 
 @router.message(F.text, Command("init"))
@@ -177,7 +227,7 @@ async def queue_init(message: Message, command: CommandObject) -> None:
     """Инициализирует определенную очередь пользователями из бд"""
     queue_name: str | None = command.args
     text: str = await queue_manager.queue_init(queue_name)
-    await message.answer(text)
+    await show_live(message, text, queue_name)
 
 
 @router.message(F.text, Command("update"))
@@ -185,51 +235,96 @@ async def queue_update(message: Message, command: CommandObject) -> None:
     """Обновляет кешированный текст у определенной очереди"""
     queue_name: str | None = command.args
     text: str = await queue_manager.queue_update_cached_text(queue_name)
-    await message.answer(text)
+    await show_live(message, text, queue_name)
 
 
 # endregion
 
 
 # region Users management
-@router.message(F.text, Command("users"))
-async def users(message: Message) -> None:
-    """Отправляет список всех пользователей бота с их параметрами"""
-    users: Sequence[User] = await get_all_users()
+USERS_HEADER = "📋 Список пользователей ⚙️"
 
+
+async def build_users_page(
+    after_id: int | None = None, before_id: int | None = None
+) -> tuple[str, InlineKeyboardMarkup | None]:
+    """Составляет одну страницу списка пользователей и клавиатуру листания.
+    Страница всегда помещается в одно сообщение
+    """
+    users, has_more = await get_users_page(
+        after_id=after_id, before_id=before_id, limit=settings.users_page_size
+    )
+    if not users and (after_id is not None or before_id is not None):
+        # Пользователи страницы могли быть удалены — показывается первая страница
+        users, has_more = await get_users_page(limit=settings.users_page_size)
+        after_id = before_id = None
     if not users:
-        text = "📋 Список пользователей пуст ⚙️"
-        await message.answer(text=text)
-        return
+        return "📋 Список пользователей пуст ⚙️", None
 
-    def format_user(user: User) -> str:
-        """Форматирует информацию о пользователе
-        Добавляет строки только если соответствующие условия выполняются
-        """
-        user_info: str = ""
-        user_info += f"🆔 ID: {user.id}"
-        if user.name:
-            user_info += f" 👤 {user.name}"
-        if user.username:
-            user_info += f" @{user.username}"
-        user_info += " 🟢 хочет" if user.has_desire else " 🔴 не хочет"
-        if not user.trusted:
-            user_info += "\n⬆️ 🚫 Не доверенный 🚫 ⬆️"
-        user_info += "\n"
-        return user_info
-
-    text = "📋 Список пользователей ⚙️\n"
-    for user in users:
-        text += format_user(user=user)
+    backward: bool = before_id is not None
+    has_prev: bool = has_more if backward else after_id is not None
+    has_next: bool = True if backward else has_more
 
-    await message.answer(text=text)
+    lines: list[str] = [render_user_info(user) for user in users]
+    count: int = fitting_count(
+        lines, MESSAGE_LIMIT, reserved=len(USERS_HEADER) + 1, from_end=backward
+    )
+    count = max(count, 1)
+    if count < len(users):
+        if backward:
+            users, lines, has_prev = users[-count:], lines[-count:], True
+        else:
+            users, lines, has_next = users[:count], lines[:count], True
+
+    text: str = split_text(USERS_HEADER + "\n" + "\n".join(lines))[0]
+    reply_markup = kb.users_pager(
+        first_id=users[0].id,
+        last_id=users[-1].id,
+        has_prev=has_prev,
+        has_next=has_next,
+    )
+    return text, reply_markup
+
+
+@router.message(F.text, Command("users"))
+async def users(message: Message) -> None:
+    """Отправляет первую страницу списка пользователей бота с их параметрами"""
+    text, reply_markup = await build_users_page()
+    await message.answer(text=text, reply_markup=reply_markup)
+
+
+@router.callback_query(kb.UsersPage.filter())
+async def users_page(callback: CallbackQuery, callback_data: kb.UsersPage) -> None:
+    """Листает список пользователей в том же сообщении"""
+    text, reply_markup = await build_users_page(
+        after_id=callback_data.after or None, before_id=callback_data.before or None
+    )
+    if isinstance(callback.message, Message):
+        try:
+            await callback.message.edit_text(text=text, reply_markup=reply_markup)
+        except TelegramBadRequest:
+            # Страница не изменилась
+            pass
+    await callback.answer()
 
 
 @router.message(F.text, Command("send_queue"))
 async def send_queue_cmd(message: Message) -> None:
     """Отправляет доверенным пользователям актуальную очередь"""
-    await send_queue()
-    text = "💬 Актуальная очередь отправлена доверенным пользователям ⚙️\n\n"
+    try:
+        queue_text: str = await queue_manager.queue_show()
+    except QueueNotFoundError as e:
+        await message.answer(text=str(e))
+        return
+    job: BroadcastJob = await job_manager.submit(
+        title="Очередь",
+        text=queue_text,
+        notify_chat_id=message.chat.id,
+    )
+    text = (
+        f"💬 Рассылка актуальной очереди запущена, задача #{job.id} ⚙️\n\n"
+        "/jobs — статус рассылок"
+    )
     await message.answer(text=text)
 
 
@@ -247,8 +342,46 @@ async def send_msg(message: Message, command: CommandObject) -> None:
         await message.answer(text=text)
         return
 
-    await send(message_text=message_text, trusted_only=True)
-    text = "💬 Сообщение отправлено доверенным пользователям ⚙️\n\n"
+    job: BroadcastJob = await job_manager.submit(
+        title="Сообщение",
+        text=message_text,
+        trusted_only=True,
+        notify_chat_id=message.chat.id,
+    )
+    text = (
+        f"💬 Рассылка сообщения доверенным пользователям запущена, задача #{job.id} ⚙️\n\n"
+        "/jobs — статус рассылок"
+    )
+    await message.answer(text=text)
+
+
+@router.message(F.text, Command("jobs"))
+async def jobs(message: Message) -> None:
+    """Показывает статус последних рассылок"""
+    job_list: list[BroadcastJob] = job_manager.get_jobs()
+    if not job_list:
+        await message.answer(text="📨 Рассылок еще не было ⚙️")
+        return
+    text = "📨 Рассылки ⚙️\n\n" + "\n".join(job.format() for job in job_list)
+    await answer_long(message, text)
+
+
+@router.message(F.text, Command("cancel_job"))
+async def cancel_job(message: Message, command: CommandObject) -> None:
+    """Отменяет рассылку по ее номеру"""
+    try:
+        job_id: int = int(command.args or "")
+    except ValueError:
+        await message.answer(
+            text="❌ Ошибка: не указан номер задачи ⚙️\n\n"
+            "Использование: /cancel_job <id> (/jobs, чтобы получить номер)"
+        )
+        return
+
+    if await job_manager.cancel(job_id):
+        text = f"🚫 Рассылка #{job_id} отменена ⚙️"
+    else:
+        text = f"❌ Рассылка #{job_id} не найдена или уже завершена"
     await message.answer(text=text)
 
 
@@ -264,7 +397,7 @@ async def validate_and_update_user(user_id_arg: str, **kwds) -> str:
     if user is None:
         return "❌ Ошибка: пользователь с таким id не найден"
 
-    await queue_manager.queue_update_cached_text()
+    queue_manager.refresh_user(user)
     return f"✅ Пользователь {user.name} обновлен"
 
 
@@ -350,28 +483,38 @@ async def trust(message: Message, command: CommandObject) -> None:
     else:
         trusted = False
 
-    results = []
+    user_ids: list[int] = []
+    invalid_args: list[str] = []
     for arg in command_args:
         try:
-            user_id = int(arg)
-            updated_user = await update_user_by_id(user_id=user_id, trusted=trusted)
-            await queue_manager.queue_update_cached_text()
-
-            if updated_user is None:
-                results.append(f"❌ Пользователь с id={user_id} не найден")
-            else:
-                name_info = f" {updated_user.name}" if updated_user.name else ""
-                username_info = (
-                    f" @{updated_user.username}" if updated_user.username else ""
-                )
-                results.append(
-                    "✅ Доверяем пользователю id="
-                    if trusted
-                    else "❎ Не доверяем пользователю id="
-                    + f"{user_id}{name_info}{username_info}"
-                )
+            user_ids.append(int(arg))
         except ValueError:
-            results.append(f'❌ "{arg}" не является числом')
+            invalid_args.append(arg)
+
+    # Один запрос на всех пользователей
+    updated_users: dict[int, User] = {
+        user.id: user
+        for user in await update_users_trust_by_ids(user_ids, trusted=trusted)
+    }
+    # Доверие не влияет на строку в очереди, но текст собирается заново один раз
+    for user in updated_users.values():
+        queue_manager.refresh_user(user)
+
+    results: list[str] = []
+    for user_id in dict.fromkeys(user_ids):
+        updated_user: User | None = updated_users.get(user_id)
+        if updated_user is None:
+            results.append(f"❌ Пользователь с id={user_id} не найден")
+            continue
+        name_info = f" {updated_user.name}" if updated_user.name else ""
+        username_info = f" @{updated_user.username}" if updated_user.username else ""
+        prefix = (
+            "✅ Доверяем пользователю id="
+            if trusted
+            else "❎ Не доверяем пользователю id="
+        )
+        results.append(f"{prefix}{user_id}{name_info}{username_info}")
+    results += [f'❌ "{arg}" не является числом' for arg in invalid_args]
 
     text = "🔒 Результат ⚙️\n\n" + "\n".join(results)
     await message.answer(text=text)
@@ -409,7 +552,7 @@ async def adm_trust_new(message: Message, command: CommandObject):
         await message.answer(text=text)
         return
 
-    await save_bot_settings({"trust_new": bool_value})
+    await bot_settings.update(trust_new=bool_value)
 
     text = f"🔒 Теперь бот {'не ' if not bool_value else ''}доверяет всем новым пользователям ⚙️\n\n"
     await message.answer(
@@ -417,4 +560,29 @@ async def adm_trust_new(message: Message, command: CommandObject):
     )
 
 
+@router.message(F.text, Command("stats"))
+async def stats(message: Message) -> None:
+    """Показывает статистику кешей и пула соединений бд"""
+    cache_stats = user_cache.stats()
+    pool_stats = pool_metrics.stats(engine.sync_engine.pool)
+    text = (
+        "📊 Статистика ⚙️\n\n"
+        "Кеш пользователей:\n"
+        f" • попадания: {cache_stats.hits}\n"
+        f" • промахи: {cache_stats.misses}\n"
+        f" • размер: {cache_stats.size}/{cache_stats.max_size}\n\n"
+        "Пул соединений бд:\n"
+        f" • выдано сейчас: {pool_stats.checked_out} "
+        f"(размер {pool_stats.size}, сверх размера {pool_stats.overflow})\n"
+        f" • всего выдач: {pool_stats.checkouts}, "
+        f"из них сверх размера: {pool_stats.overflow_checkouts}\n"
+        f" • ожидание: среднее {pool_stats.avg_wait_ms:.1f} мс, "
+        f"максимум {pool_stats.max_wait_ms:.1f} мс\n"
+        f" • таймауты: {pool_stats.timeouts}\n"
+        f" • новые соединения: {pool_stats.connects}, "
+        f"нерабочие: {pool_stats.invalidations}\n"
+    )
+    await message.answer(text=text)
+
+
 # endregion
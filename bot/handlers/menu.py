@@ -1,22 +1,62 @@
 from aiogram import F, Router
 from aiogram.filters import Command
+from aiogram.filters.command import CommandObject
 from aiogram.types import Message
 
 from bot import keyboards as kb
-from bot.db import get_user, update_user
+from bot.db import (
+    User,
+    get_all_trusted_users,
+    get_user,
+    subscribe_user_updates,
+    update_user,
+)
 from bot.middlewares import IsTrustedMiddleware
 from bot.utils import queue_manager
+from bot.utils.live_queue import live_queue
+from bot.utils.messages import answer_long
+from bot.utils.queue import QueueNotFoundError
+from bot.utils.rendering import RenderStyle, parse_view
+
+is_trusted = IsTrustedMiddleware(
+    get_user_func=get_user, get_trusted_users_func=get_all_trusted_users
+)
+# Кеш доверия заполняется при запуске и обновляется при каждом изменении пользователя
+subscribe_user_updates(is_trusted.on_user_updated)
 
 router = Router()
-router.message.middleware(IsTrustedMiddleware(get_user_func=get_user))
+router.startup.register(is_trusted.load)
+router.message.middleware(is_trusted)
 
 
 @router.message(F.text.lower().in_(["меню", "menu"]))
 @router.message(Command("menu"))
-async def menu(message: Message):
-    text = await queue_manager.queue_show()
-    await message.answer(
-        text=text, reply_markup=kb.menu.as_markup(resize_keyboard=True)
+async def menu(message: Message, command: CommandObject | None = None):
+    """Очередь в выбранном виде: /menu [все | хотят | топ <N> | я <K>]"""
+    style, size, _ = parse_view(command.args if command else None)
+    await show_menu(message, style, size)
+
+
+@router.message(F.text.lower() == "желающие")
+async def menu_desiring(message: Message):
+    await show_menu(message, RenderStyle.DESIRING)
+
+
+@router.message(F.text.lower().in_(["моё место", "мое место"]))
+async def menu_my_position(message: Message):
+    await show_menu(message, RenderStyle.AROUND)
+
+
+async def show_menu(
+    message: Message, style: RenderStyle, size: int | None = None
+) -> None:
+    tg_id: int | None = message.from_user.id if message.from_user else None
+    try:
+        text = await queue_manager.queue_show(style=style, size=size, tg_id=tg_id)
+    except QueueNotFoundError as e:
+        text = str(e)
+    await answer_long(
+        message, text, reply_markup=kb.menu.as_markup(resize_keyboard=True)
     )
 
 
@@ -35,13 +75,47 @@ async def no(message: Message):
 async def process_desire(message: Message, desire: bool):
     if message.from_user is None:
         return
-    await update_user(tg_id=message.from_user.id, has_desire=desire)
-    await queue_manager.queue_update_cached_text()
+    user: User | None = await update_user(
+        tg_id=message.from_user.id, has_desire=desire
+    )
+    if user is not None:
+        queue_manager.refresh_user(user)
+        # Ответ показывает уже обновленную очередь без ожидания окна пересборки
+        queue_manager.rebuild_current_text()
+    try:
+        queue_text: str = await queue_manager.queue_show()
+    except QueueNotFoundError as e:
+        queue_text = str(e)
     text: str = (
         f"{'🟢 Ты добавлен в очередь!' if desire else '🔴 Ты удалён из очереди!'}\n\n"
-        + (await queue_manager.queue_show())
+        + queue_text
+    )
+    await answer_long(
+        message,
+        text,
+        reply_markup=kb.menu.as_markup(resize_keyboard=True),
     )
+
+
+@router.message(Command("live"))
+async def live(message: Message):
+    """Включает закрепленную очередь, которая обновляется автоматически"""
+    await live_queue.subscribe(message.chat.id)
+    try:
+        text: str = await queue_manager.queue_show()
+    except QueueNotFoundError:
+        await message.answer(
+            text="📌 Очередь закрепится здесь, когда администратор установит текущую"
+        )
+        return
+    await live_queue.show(message.chat.id, text)
+
+
+@router.message(Command("unlive"))
+async def unlive(message: Message):
+    """Выключает автоматическое обновление закрепленной очереди"""
+    await live_queue.unsubscribe(message.chat.id)
     await message.answer(
-        text=text,
+        text="📌 Закрепленная очередь больше не будет обновляться",
         reply_markup=kb.menu.as_markup(resize_keyboard=True),
     )
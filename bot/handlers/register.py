@@ -5,7 +5,7 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import Message
 
 from bot import keyboards as kb
-from bot.db import update_user
+from bot.db import User, update_user
 from bot.utils import queue_manager
 
 router = Router()
@@ -37,12 +37,13 @@ async def cancel(message: Message, state: FSMContext):
 async def enter_name(message: Message, state: FSMContext):
     if message.from_user is None:
         return
-    await update_user(
+    user: User | None = await update_user(
         tg_id=message.from_user.id,
         username=message.from_user.username,
         name=message.text,
     )
-    await queue_manager.queue_update_cached_text()
+    if user is not None:
+        queue_manager.refresh_user(user)
     await state.clear()
 
     text = "✨ Отлично! Твоё имя сохранено\n\nИспользуй кнопку ниже или /menu, чтобы перейти в меню"
@@ -6,7 +6,7 @@ from aiogram.types.reply_keyboard_markup import ReplyKeyboardMarkup
 
 from bot import keyboards as kb
 from bot.db import User, create_user
-from bot.utils.json_storage import load_bot_settings
+from bot.utils.bot_settings import bot_settings
 
 router = Router()
 
@@ -14,7 +14,7 @@ router = Router()
 @router.message(CommandStart())
 async def cmd_start(message: Message, state: FSMContext):
     await state.clear()
-    trusted: bool = (await load_bot_settings())["trust_new"]
+    trusted: bool = bot_settings.trust_new
     if message.from_user is None:
         return
     user: User | None = await create_user(
@@ -45,7 +45,9 @@ async def cmd_help(message: Message, state: FSMContext):
         "- /start - начать работу с ботом\n"
         "- /help - показать помощь\n"
         "- /menu - показать текущую очередь\n"
+        "- /menu хотят, /menu топ <N>, /menu я <K> - только желающие, первые N или твое место ± K\n"
         "- /name - изменить имя пользователя\n"
         "- /yes, /no - установить свое состояние желания\n"
+        "- /live, /unlive - включить или выключить закрепленную очередь, которая обновляется сама\n"
     )
     await message.answer(text=text)
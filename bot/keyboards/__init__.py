@@ -1,4 +1,4 @@
-from .admin import admin
+from .admin import UsersPage, admin, users_pager
 from .keyboards import menu, start_register, to_menu
 
 __all__ = [
@@ -6,4 +6,6 @@ __all__ = [
     "menu",
     "start_register",
     "to_menu",
+    "users_pager",
+    "UsersPage",
 ]
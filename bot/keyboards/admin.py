@@ -1,8 +1,38 @@
-from aiogram.types import KeyboardButton
-from aiogram.utils.keyboard import ReplyKeyboardBuilder
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardMarkup, KeyboardButton
+from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
 admin = ReplyKeyboardBuilder()
 admin.row(
     KeyboardButton(text="/next"),
     KeyboardButton(text="/menu"),
 )
+
+
+class UsersPage(CallbackData, prefix="users"):
+    """Листание списка пользователей. 0 — не задано (id в бд начинаются с 1)"""
+
+    after: int = 0
+    """Следующая страница: пользователи после этого id"""
+    before: int = 0
+    """Предыдущая страница: пользователи перед этим id"""
+
+
+def users_pager(
+    first_id: int, last_id: int, has_prev: bool, has_next: bool
+) -> InlineKeyboardMarkup | None:
+    """Клавиатура листания списка пользователей
+    Args:
+        first_id (int): Id первого пользователя на странице
+        last_id (int): Id последнего пользователя на странице
+        has_prev (bool): Есть ли предыдущая страница
+        has_next (bool): Есть ли следующая страница
+    """
+    if not has_prev and not has_next:
+        return None
+    builder = InlineKeyboardBuilder()
+    if has_prev:
+        builder.button(text="⬅️", callback_data=UsersPage(before=first_id))
+    if has_next:
+        builder.button(text="➡️", callback_data=UsersPage(after=last_id))
+    return builder.as_markup()
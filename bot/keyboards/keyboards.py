@@ -14,3 +14,7 @@ menu.row(
     KeyboardButton(text="Не хочу"),
 )
 menu.add(KeyboardButton(text="Меню"))
+menu.row(
+    KeyboardButton(text="Желающие"),
+    KeyboardButton(text="Моё место"),
+)
@@ -1,5 +1,6 @@
-from .middlewares import IsTrustedMiddleware
+from .middlewares import DbSessionMiddleware, IsTrustedMiddleware
 
 __all__ = [
+    "DbSessionMiddleware",
     "IsTrustedMiddleware",
 ]
@@ -1,21 +1,84 @@
 import logging
-from typing import Any, Awaitable, Callable
+from time import monotonic
+from typing import Any, Awaitable, Callable, Sequence
 
 from aiogram import BaseMiddleware
 from aiogram.types import Message, TelegramObject
 
-from bot.db import User
+from bot.db import User, unit_of_work
 
 
 class IsTrustedMiddleware(BaseMiddleware):
-    """Фильтр для проверки доверенного пользователя"""
+    """Фильтр для проверки доверенного пользователя.
+    Хранит множество доверенных tg_id и негативный кеш для недоверенных и неизвестных,
+    поэтому проверка на горячем пути обходится без запросов к бд
+    """
 
-    def __init__(self, get_user_func: Callable[[int], Awaitable[User | None]]):
+    def __init__(
+        self,
+        get_user_func: Callable[[int], Awaitable[User | None]],
+        get_trusted_users_func: Callable[[], Awaitable[Sequence[User]]] | None = None,
+        negative_ttl: float = 60.0,
+        negative_max_size: int = 10_000,
+    ):
         """
         Args:
             get_user_func: Асинхронная функция get_user(tg_id: int) -> User | None
+            get_trusted_users_func: Асинхронная функция get_all_trusted_users() -> Sequence[User],
+            используется для заполнения кеша при запуске
+            negative_ttl: Сколько секунд помнить, что пользователь не доверенный или неизвестный
+            negative_max_size: Сколько таких пользователей помнить одновременно
         """
         self.get_user_func: Callable[[int], Awaitable[User | None]] = get_user_func
+        self.get_trusted_users_func: (
+            Callable[[], Awaitable[Sequence[User]]] | None
+        ) = get_trusted_users_func
+        self.negative_ttl: float = negative_ttl
+        self.negative_max_size: int = negative_max_size
+        self._trusted: set[int] = set()
+        """tg_id доверенных пользователей"""
+        self._denied: dict[int, float] = {}
+        """Негативный кеш: tg_id -> время устаревания записи"""
+
+    async def load(self) -> None:
+        """Заполняет кеш доверенных пользователей одним запросом"""
+        if self.get_trusted_users_func is None:
+            return
+        users: Sequence[User] = await self.get_trusted_users_func()
+        self._trusted = {user.tg_id for user in users}
+        self._denied.clear()
+        logging.info(f"Trust cache loaded, {len(self._trusted)} trusted users")
+
+    def on_user_updated(self, user: User) -> None:
+        """Обновляет кеш при изменении пользователя (/trust, /untrust, create_user)"""
+        self._denied.pop(user.tg_id, None)
+        if user.trusted:
+            self._trusted.add(user.tg_id)
+        else:
+            self._trusted.discard(user.tg_id)
+
+    async def is_trusted(self, tg_id: int) -> bool:
+        """Проверяет доверие пользователя, обращаясь к бд только при промахе кеша"""
+        if tg_id in self._trusted:
+            return True
+        expires: float | None = self._denied.get(tg_id)
+        now: float = monotonic()
+        if expires is not None and expires > now:
+            return False
+
+        user: User | None = await self.get_user_func(tg_id)
+        if user is not None and user.trusted:
+            self._trusted.add(tg_id)
+            return True
+        if len(self._denied) >= self.negative_max_size:
+            self._denied = {k: v for k, v in self._denied.items() if v > now}
+            # Если все записи еще живы, вытесняются самые старые
+            for stale in list(self._denied)[
+                : len(self._denied) - self.negative_max_size + 1
+            ]:
+                del self._denied[stale]
+        self._denied[tg_id] = now + self.negative_ttl
+        return False
 
     async def __call__(
         self,
@@ -29,11 +92,25 @@ class IsTrustedMiddleware(BaseMiddleware):
         if not event.from_user:
             return None
 
-        user: User | None = await self.get_user_func(event.from_user.id)
-        if user.trusted if user else False:
+        if await self.is_trusted(event.from_user.id):
             return await handler(event, data)
         else:
             await event.answer(
                 "У вас нет доступа к этому боту. Обратитесь к администратору."
             )
             return None
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """Открывает одну сессию бд на апдейт (unit of work).
+    Все вызовы репозитория внутри обработчика используют ее, коммит — один в конце
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        async with unit_of_work():
+            return await handler(event, data)
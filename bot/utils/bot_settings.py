@@ -0,0 +1,43 @@
+import asyncio
+from typing import Any
+
+from bot.utils.json_storage import BotSettings, load_bot_settings, save_bot_settings
+
+DEFAULT_BOT_SETTINGS: BotSettings = {"trust_new": True}
+"""Значения настроек, которых еще нет в файле"""
+
+
+class BotSettingsService:
+    """Настройки бота, которые меняются внутри него.
+    - Загружаются из файла один раз при запуске, читаются из памяти
+    - Изменения сразу записываются в файл (write-through)
+    """
+
+    def __init__(self) -> None:
+        self._settings: BotSettings = DEFAULT_BOT_SETTINGS.copy()
+        self._lock = asyncio.Lock()
+
+    async def load(self) -> None:
+        """Загружает настройки из файла, недостающие берутся по умолчанию"""
+        loaded: BotSettings = await load_bot_settings()
+        self._settings = {**DEFAULT_BOT_SETTINGS, **loaded}
+
+    async def update(self, **changes: Any) -> None:
+        """Изменяет настройки в памяти и сохраняет их в файл
+        Args:
+            **changes: Новые значения настроек, например trust_new=False
+        """
+        unknown: set[str] = set(changes) - set(DEFAULT_BOT_SETTINGS)
+        if unknown:
+            raise KeyError(f"Unknown bot settings: {', '.join(sorted(unknown))}")
+        async with self._lock:
+            self._settings = {**self._settings, **changes}  # type: ignore
+            await save_bot_settings(self._settings)
+
+    @property
+    def trust_new(self) -> bool:
+        """Доверять ли новым пользователям"""
+        return self._settings["trust_new"]
+
+
+bot_settings = BotSettingsService()
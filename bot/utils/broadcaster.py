@@ -1,25 +1,282 @@
-from typing import Sequence
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from time import monotonic
+from typing import Any, Awaitable, Callable, Iterable, Protocol, Sequence
+
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
 
 from bot.create_bot import bot
 from bot.db import User, get_all_trusted_users, get_all_users
+from bot.utils.messages import split_text
 from bot.utils.queue import queue_manager
+from config import settings
+
+
+class MessageSender(Protocol):
+    """Отправитель сообщений рассылки: send_message(chat_id, text=...).
+    Bot подходит: остальные его аргументы необязательны"""
+
+    async def send_message(self, chat_id: int | str, text: str) -> Any: ...
+
+
+class TokenBucket:
+    """Ограничитель скорости "ведро с токенами".
+    Отдает не больше rate токенов в секунду, накапливая до capacity токенов
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate: float = rate
+        self.capacity: float = capacity if capacity is not None else rate
+        self._tokens: float = self.capacity
+        self._updated: float = monotonic()
+        self._paused_until: float = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """Приостанавливает выдачу токенов (например, по retry_after от Telegram)"""
+        self._paused_until = max(self._paused_until, monotonic() + seconds)
+
+    def is_idle(self, now: float) -> bool:
+        """Никто не ждет токен и ведро уже наполнилось: его можно удалить
+        и создать заново без изменения лимита"""
+        return (
+            not self._lock.locked()
+            and now >= self._paused_until
+            and self._tokens + (now - self._updated) * self.rate >= self.capacity
+        )
+
+    async def acquire(self) -> None:
+        """Ждет, пока не появится токен, и забирает его"""
+        async with self._lock:
+            while True:
+                now: float = monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class DeliveryReport:
+    """Отчет о рассылке по каждому получателю"""
+
+    total: int = 0
+    """Количество получателей"""
+    sent: list[int] = field(default_factory=list)
+    """chat_id, которым сообщение доставлено"""
+    failed: dict[int, str] = field(default_factory=dict)
+    """chat_id -> причина, по которой сообщение не доставлено"""
+    started_at: float = field(default_factory=monotonic)
+    finished_at: float | None = None
+
+    @property
+    def duration(self) -> float:
+        """Длительность рассылки в секундах"""
+        return (self.finished_at or monotonic()) - self.started_at
+
+    def summary(self, max_failures: int = 20) -> str:
+        """Текст отчета для администратора"""
+        text = f"📨 Доставлено {len(self.sent)} из {self.total} за {self.duration:.1f} с"
+        if self.failed:
+            text += "\n\nНе доставлено:\n" + "\n".join(
+                f" • {chat_id}: {reason}"
+                for chat_id, reason in list(self.failed.items())[:max_failures]
+            )
+            if len(self.failed) > max_failures:
+                text += f"\n ... и еще {len(self.failed) - max_failures}"
+        return text
+
+
+class Broadcaster:
+    """Рассылка сообщений с ограничением параллельности и скорости.
+    - Общий лимит Telegram (~30 сообщений/с) и лимит на один чат
+    - Учитывает retry_after (flood control) и повторяет сетевые ошибки с backoff
+    - Возвращает отчет о доставке каждому получателю
+    """
 
+    def __init__(
+        self,
+        sender: MessageSender,
+        rate: float | None = None,
+        chat_rate: float | None = None,
+        concurrency: int | None = None,
+        max_retries: int | None = None,
+        backoff: float = 1.0,
+    ) -> None:
+        """
+        Args:
+            sender (MessageSender): Bot, отправляющий сообщения
+            rate (float | None): Общий лимит сообщений в секунду
+            chat_rate (float | None): Лимит сообщений в секунду в один чат
+            concurrency (int | None): Максимальное количество одновременных отправок
+            max_retries (int | None): Количество повторов при временных ошибках
+            backoff (float): Начальная задержка между повторами в секундах, удваивается
 
-async def send(message_text: str, trusted_only: bool = True) -> None:
+            Не указанные лимиты берутся из настроек в момент создания
+        """
+        self.sender: MessageSender = sender
+        self.chat_rate: float = (
+            chat_rate if chat_rate is not None else settings.broadcast_chat_rate
+        )
+        self.concurrency: int = (
+            concurrency if concurrency is not None else settings.broadcast_concurrency
+        )
+        self.max_retries: int = (
+            max_retries if max_retries is not None else settings.broadcast_max_retries
+        )
+        self.backoff: float = backoff
+        self._global_bucket = TokenBucket(
+            rate if rate is not None else settings.broadcast_rate
+        )
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._swept_at: float = monotonic()
+        """Когда из _chat_buckets последний раз удалялись простаивающие ведра"""
+
+    async def acquire(self, chat_id: int) -> None:
+        """Ждет разрешения на один запрос в чат в пределах общих лимитов рассылки.
+        Нужен всем, кто отправляет или редактирует сообщения массово"""
+        await self._chat_bucket(chat_id).acquire()
+        await self._global_bucket.acquire()
+
+    def pause(self, seconds: float) -> None:
+        """Приостанавливает все отправки (flood control)"""
+        self._global_bucket.pause(seconds)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket: TokenBucket | None = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            self._sweep_chat_buckets()
+            bucket = TokenBucket(self.chat_rate, capacity=1)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _sweep_chat_buckets(self) -> None:
+        """Удаляет ведра чатов, которые простаивают дольше окна пополнения.
+        Словарь обходится не чаще раза за окно, а не при каждом новом чате"""
+        now: float = monotonic()
+        if now - self._swept_at < 1 / self.chat_rate:
+            return
+        self._swept_at = now
+        self._chat_buckets = {
+            chat_id: bucket
+            for chat_id, bucket in self._chat_buckets.items()
+            if not bucket.is_idle(now)
+        }
+
+    async def broadcast(
+        self,
+        chat_ids: Iterable[int],
+        text: str,
+        on_progress: Callable[[DeliveryReport], Awaitable[None] | None] | None = None,
+    ) -> DeliveryReport:
+        """Отправляет сообщение всем получателям
+        Args:
+            chat_ids (Iterable[int]): Получатели
+            text (str): Текст сообщения
+            on_progress (Callable, optional): Вызывается после каждого получателя с текущим отчетом
+        Returns:
+            DeliveryReport: Отчет о доставке
+        """
+        recipients: list[int] = list(dict.fromkeys(chat_ids))
+        report = DeliveryReport(total=len(recipients))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # Длинный текст уходит несколькими сообщениями по границам строк
+        chunks: list[str] = split_text(text)
+
+        async def deliver(chat_id: int) -> None:
+            error: str | None = None
+            async with semaphore:
+                for chunk in chunks:
+                    error = await self._deliver(chat_id, chunk)
+                    if error is not None:
+                        break
+            if error is None:
+                report.sent.append(chat_id)
+            else:
+                report.failed[chat_id] = error
+            if on_progress is not None:
+                result = on_progress(report)
+                if result is not None:
+                    await result
+
+        await asyncio.gather(*(deliver(chat_id) for chat_id in recipients))
+        report.finished_at = monotonic()
+        logging.info(
+            f"Broadcast finished: sent {len(report.sent)}/{report.total} "
+            f"in {report.duration:.1f}s"
+        )
+        return report
+
+    async def _deliver(self, chat_id: int, text: str) -> str | None:
+        """Отправляет одно сообщение с повторами
+        Returns:
+            str | None: Причина ошибки или None, если доставлено
+        """
+        error: str = ""
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(chat_id)
+            try:
+                await self.sender.send_message(chat_id, text=text)
+                return None
+
+            except TelegramRetryAfter as e:
+                # Flood control действует на весь бот: останавливаем всю рассылку
+                logging.warning(f"Flood control, retry after {e.retry_after}s")
+                self._global_bucket.pause(e.retry_after)
+                error = f"flood control ({e.retry_after} с)"
+
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                # Бот заблокирован или чат не найден: повтор не поможет
+                return e.message
+
+            except (TelegramNetworkError, TelegramServerError) as e:
+                error = e.message
+                await asyncio.sleep(self.backoff * 2**attempt)
+
+            except Exception as e:
+                logging.error(e)
+                return str(e)
+
+        return error
+
+
+# Экземпляр для импорта в других частях проекта
+broadcaster = Broadcaster(bot)
+
+
+async def send(message_text: str, trusted_only: bool = True) -> DeliveryReport:
     """Отправляет сообщение всем пользователям
     Args:
         message_text (str): Сообщение, которое будет отправлено
         trusted_only (bool, optional): Если true, то сообщение отправится только доверенным пользователям, в ином случае всем
+    Returns:
+        DeliveryReport: Отчет о доставке
     """
     if trusted_only:
         users: Sequence[User] = await get_all_trusted_users()
     else:
         users = await get_all_users()
-    for user in users:
-        await bot.send_message(user.tg_id, text=message_text)
+    return await broadcaster.broadcast((user.tg_id for user in users), message_text)
 
 
-async def send_queue() -> None:
-    """Отправляет доверенным пользователям актуальную очередь"""
+async def send_queue() -> DeliveryReport:
+    """Отправляет доверенным пользователям актуальную очередь
+    Raises:
+        QueueNotFoundError: Текущая очередь не установлена
+    """
 
-    await send(await queue_manager.queue_show())
+    return await send(await queue_manager.queue_show())
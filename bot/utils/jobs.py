@@ -0,0 +1,291 @@
+import asyncio
+import logging
+from dataclasses import asdict, dataclass, fields
+from time import time
+from typing import Any, Literal
+
+from bot.create_bot import bot
+from bot.db import get_all_trusted_users, get_all_users
+from bot.utils.broadcaster import Broadcaster, DeliveryReport, broadcaster
+from bot.utils.json_storage import load_jobs, save_jobs
+from config import settings
+
+JobStatus = Literal["pending", "running", "done", "failed", "cancelled", "interrupted"]
+
+STATUS_ICONS: dict[str, str] = {
+    "pending": "⏳",
+    "running": "🚀",
+    "done": "✅",
+    "failed": "❌",
+    "cancelled": "🚫",
+    "interrupted": "⚠️",
+}
+
+
+@dataclass
+class BroadcastJob:
+    """Фоновая задача рассылки"""
+
+    id: int
+    title: str
+    """Название задачи для вывода (например, "Очередь")"""
+    text: str
+    """Текст сообщения"""
+    trusted_only: bool = True
+    """Отправлять только доверенным пользователям"""
+    notify_chat_id: int | None = None
+    """Чат, в который отправить отчет по завершении"""
+    status: JobStatus = "pending"
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    created_at: float = 0.0
+    started_at: float | None = None
+    finished_at: float | None = None
+
+    @property
+    def throughput(self) -> float:
+        """Скорость рассылки в сообщениях в секунду"""
+        if self.started_at is None:
+            return 0.0
+        duration: float = (self.finished_at or time()) - self.started_at
+        return (self.sent + self.failed) / duration if duration > 0 else 0.0
+
+    def format(self) -> str:
+        """Строка задачи для /jobs"""
+        return (
+            f"{STATUS_ICONS[self.status]} #{self.id} {self.title}: {self.status}, "
+            f"{self.sent + self.failed}/{self.total} "
+            f"(✅ {self.sent}, ❌ {self.failed}), {self.throughput:.1f} сообщ./с"
+        )
+
+
+JOB_FIELDS: frozenset[str] = frozenset(field.name for field in fields(BroadcastJob))
+"""Поля задачи, которые читаются из файла"""
+
+
+def load_job(raw: Any) -> BroadcastJob | None:
+    """Восстанавливает задачу из записи файла.
+    Неизвестные поля (например, из другой версии бота) отбрасываются
+    Returns:
+        BroadcastJob | None: Задача или None, если запись повреждена
+    """
+    try:
+        job = BroadcastJob(
+            **{key: value for key, value in raw.items() if key in JOB_FIELDS}
+        )
+    except (AttributeError, TypeError) as e:
+        logging.warning(f"Broken job record skipped: {raw!r} ({e})")
+        return None
+    if job.status not in STATUS_ICONS:
+        logging.warning(f"Job record with unknown status skipped: {raw!r}")
+        return None
+    return job
+
+
+class JobManager:
+    """Очередь фоновых задач рассылки с пулом asyncio-воркеров.
+    Записи задач сохраняются в хранилище и переживают перезапуск
+    """
+
+    def __init__(
+        self,
+        broadcaster: Broadcaster,
+        workers: int = 1,
+        keep_jobs: int = 50,
+        save_interval: float = 5.0,
+    ) -> None:
+        """
+        Args:
+            broadcaster (Broadcaster): Рассыльщик сообщений
+            workers (int): Количество одновременно выполняемых задач
+            keep_jobs (int): Сколько последних задач хранить
+            save_interval (float): Как часто сохранять прогресс выполняющейся задачи, секунды
+        """
+        self._broadcaster: Broadcaster = broadcaster
+        self._workers_count: int = workers
+        self._keep_jobs: int = keep_jobs
+        self._save_interval: float = save_interval
+        self._jobs: dict[int, BroadcastJob] = {}
+        self._next_id: int = 1
+        self._pending: asyncio.Queue[int] = asyncio.Queue()
+        self._workers: list[asyncio.Task] = []
+        self._running: dict[int, asyncio.Task] = {}
+        self._stopping: bool = False
+        self._save_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """Загружает задачи из файла и запускает воркеры"""
+        data: dict = await load_jobs()
+        for raw in data.get("jobs", []):
+            job: BroadcastJob | None = load_job(raw)
+            if job is None:
+                continue
+            if job.status == "running":
+                # Повторный запуск разослал бы сообщения второй раз
+                job.status = "interrupted"
+            self._jobs[job.id] = job
+            if job.status == "pending":
+                self._pending.put_nowait(job.id)
+        self._next_id = data.get("next_id", max(self._jobs, default=0) + 1)
+        self._stopping = False
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self._workers_count)
+        ]
+
+    async def stop(self) -> None:
+        """Останавливает воркеры и сохраняет задачи"""
+        self._stopping = True
+        tasks: list[asyncio.Task] = [*self._running.values(), *self._workers]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        await self._save()
+
+    async def submit(
+        self,
+        title: str,
+        text: str,
+        trusted_only: bool = True,
+        notify_chat_id: int | None = None,
+    ) -> BroadcastJob:
+        """Ставит рассылку в очередь и сразу возвращает задачу"""
+        job = BroadcastJob(
+            id=self._next_id,
+            title=title,
+            text=text,
+            trusted_only=trusted_only,
+            notify_chat_id=notify_chat_id,
+            created_at=time(),
+        )
+        self._next_id += 1
+        self._jobs[job.id] = job
+        self._pending.put_nowait(job.id)
+        await self._save()
+        return job
+
+    async def cancel(self, job_id: int) -> bool:
+        """Отменяет ожидающую или выполняющуюся задачу
+        Returns:
+            bool: Была ли задача отменена
+        """
+        job: BroadcastJob | None = self._jobs.get(job_id)
+        if job is None or job.status not in ("pending", "running"):
+            return False
+        task: asyncio.Task | None = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+        else:
+            job.status = "cancelled"
+            job.finished_at = time()
+            await self._save()
+        return True
+
+    def get_jobs(self, limit: int = 10) -> list[BroadcastJob]:
+        """Возвращает последние задачи, новые первыми"""
+        return sorted(self._jobs.values(), key=lambda job: job.id, reverse=True)[
+            :limit
+        ]
+
+    async def _worker(self) -> None:
+        while True:
+            job_id: int = await self._pending.get()
+            job: BroadcastJob | None = self._jobs.get(job_id)
+            if job is None or job.status != "pending":
+                continue
+            task: asyncio.Task = asyncio.create_task(self._run(job))
+            self._running[job.id] = task
+            try:
+                # wait, а не await: отмена задачи не должна останавливать воркер
+                await asyncio.wait({task})
+            finally:
+                self._running.pop(job.id, None)
+
+    async def _run(self, job: BroadcastJob) -> None:
+        """Выполняет рассылку, обновляя прогресс задачи"""
+
+        def on_progress(report: DeliveryReport) -> None:
+            job.sent = len(report.sent)
+            job.failed = len(report.failed)
+
+        report: DeliveryReport | None = None
+        saver: asyncio.Task | None = None
+        try:
+            # Статус меняется внутри try: отмена на любом await не оставит задачу "running"
+            job.status = "running"
+            job.started_at = time()
+            await self._save()
+            saver = asyncio.create_task(self._save_progress())
+            if job.trusted_only:
+                users = await get_all_trusted_users()
+            else:
+                users = await get_all_users()
+            job.total = len(users)
+            report = await self._broadcaster.broadcast(
+                (user.tg_id for user in users), job.text, on_progress=on_progress
+            )
+            job.status = "done"
+
+        except asyncio.CancelledError:
+            job.status = "interrupted" if self._stopping else "cancelled"
+
+        except Exception as e:
+            logging.error(e)
+            job.status = "failed"
+
+        finally:
+            if saver is not None:
+                saver.cancel()
+            if job.status == "running":
+                job.status = "interrupted"
+            job.finished_at = time()
+            # Финальное сохранение не прерывается повторной отменой
+            await asyncio.shield(self._save())
+        if not self._stopping:
+            await self._notify(job, report)
+
+    async def _save_progress(self) -> None:
+        """Периодически сохраняет прогресс, чтобы после падения было видно, сколько отправлено"""
+        while True:
+            await asyncio.sleep(self._save_interval)
+            try:
+                await self._save()
+            except Exception as e:
+                logging.error(e)
+
+    async def _notify(self, job: BroadcastJob, report: DeliveryReport | None) -> None:
+        """Отправляет отчет о завершении задачи администратору"""
+        if job.notify_chat_id is None:
+            return
+        text: str = f"📨 Задача #{job.id} {job.title}: {job.status} ⚙️"
+        if report is not None:
+            text += "\n\n" + report.summary()
+        try:
+            await bot.send_message(job.notify_chat_id, text=text)
+        except Exception as e:
+            logging.error(e)
+
+    async def _save(self) -> None:
+        # Записи по очереди: последним в файл попадает самое новое состояние
+        async with self._save_lock:
+            jobs: list[BroadcastJob] = sorted(
+                self._jobs.values(), key=lambda job: job.id
+            )
+            for job in jobs[: -self._keep_jobs]:
+                if job.status not in ("pending", "running"):
+                    del self._jobs[job.id]
+            await save_jobs(
+                {
+                    "next_id": self._next_id,
+                    "jobs": [asdict(job) for job in self._jobs.values()],
+                }
+            )
+
+
+# Экземпляр для импорта в других частях проекта
+job_manager = JobManager(
+    broadcaster,
+    workers=settings.broadcast_workers,
+    save_interval=settings.broadcast_progress_save_interval,
+)
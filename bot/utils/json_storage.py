@@ -1,13 +1,20 @@
+import asyncio
 import json
 import logging
-from typing import TypedDict
+import os
+import tempfile
+from typing import Any, TypedDict
 
 import aiofiles
 
 from config import settings
 
 QUEUES_FILE_PATH = settings.storage_path + "/queues.json"
+QUEUES_LOG_FILE_PATH = settings.storage_path + "/queues.log"
+QUEUES_IMPORTED_FILE_PATH = settings.storage_path + "/queues-imported"
 BOT_SETTINGS_FILE_PATH = settings.storage_path + "/bot-settings.json"
+JOBS_FILE_PATH = settings.storage_path + "/jobs.json"
+LIVE_MESSAGES_FILE_PATH = settings.storage_path + "/live-messages.json"
 
 
 class BotSettings(TypedDict):
@@ -16,27 +23,121 @@ class BotSettings(TypedDict):
     trust_new: bool
 
 
-async def load_queues() -> dict[str, list[int]]:
-    """Возвращает очереди из файла"""
+def _write_atomic(path: str, data: str) -> None:
+    """Записывает файл атомарно: временный файл + fsync + rename.
+    При падении во время записи на диске остается старая версия файла
+    """
+    directory: str = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, mode="w", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _append_lines(path: str, lines: list[str]) -> None:
+    """Дописывает строки в конец файла и сбрасывает их на диск"""
+    with open(path, mode="a", encoding="utf-8") as f:
+        f.write("".join(line + "\n" for line in lines))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+async def write_atomic(path: str, data: str) -> None:
+    """Атомарно записывает файл, не блокируя цикл событий"""
+    await asyncio.to_thread(_write_atomic, path, data)
+
+
+async def load_queues() -> tuple[dict[str, list[int]], int]:
+    """Возвращает очереди из файла
+    Returns:
+        tuple[dict[str, list[int]], int]: Очереди и номер последней записи журнала,
+        вошедшей в снимок (0 для снимков старого формата)
+    """
     try:
         async with aiofiles.open(QUEUES_FILE_PATH, mode="r") as f:
             string: str = await f.read()
-        data: dict[str, list[int]] = json.loads(string)
+        data: dict[str, Any] = json.loads(string)
         logging.info("Queues loaded from file")
-        return data
+        if isinstance(data.get("queues"), dict) and isinstance(data.get("seq"), int):
+            return data["queues"], data["seq"]
+        # Старый формат: только очереди
+        return data, 0
 
     except Exception as e:
         logging.error(e)
-        return dict()
+        return dict(), 0
+
+
+async def save_queues(data: dict[str, list[int]], seq: int) -> bool:
+    """Атомарно сохраняет очереди в файл (снимок)
+    Args:
+        data (dict[str, list[int]]): Очереди
+        seq (int): Номер последней записи журнала, вошедшей в снимок
+    Returns:
+        bool: Удалось ли сохранить
+    """
+    json_string: str = json.dumps({"seq": seq, "queues": data})
+    try:
+        await write_atomic(QUEUES_FILE_PATH, json_string)
+        logging.info("Queues saved to file")
+        return True
+
+    except Exception as e:
+        logging.error(e)
+        return False
 
 
-async def save_queues(data: dict[str, list[int]]) -> None:
-    """Сохраняет очереди в файл"""
-    json_string: str = json.dumps(data, indent=4)
+async def load_queues_log() -> list[dict[str, Any]]:
+    """Возвращает записи журнала изменений очередей, сделанные после снимка"""
+    records: list[dict[str, Any]] = []
     try:
-        async with aiofiles.open(QUEUES_FILE_PATH, mode="w") as f:
-            await f.write(json_string)
-        logging.info("Queues saved to file")
+        async with aiofiles.open(QUEUES_LOG_FILE_PATH, mode="r") as f:
+            async for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Недописанная последняя строка после падения
+                    logging.error(f"Broken queues log record skipped: {line!r}")
+        logging.info(f"Queues log loaded, {len(records)} records")
+        return records
+
+    except FileNotFoundError:
+        return records
+
+    except Exception as e:
+        logging.error(e)
+        return records
+
+
+async def append_queues_log(records: list[dict[str, Any]]) -> None:
+    """Дописывает записи в журнал изменений очередей"""
+    lines: list[str] = [json.dumps(record) for record in records]
+    await asyncio.to_thread(_append_lines, QUEUES_LOG_FILE_PATH, lines)
+
+
+async def clear_queues_log() -> None:
+    """Очищает журнал изменений очередей (после сохранения снимка)"""
+    await write_atomic(QUEUES_LOG_FILE_PATH, "")
+
+
+async def is_queues_imported() -> bool:
+    """Перенесены ли уже очереди из файлов в бд"""
+    return await asyncio.to_thread(os.path.exists, QUEUES_IMPORTED_FILE_PATH)
+
+
+async def mark_queues_imported() -> None:
+    """Отмечает, что очереди из файлов перенесены в бд и больше не переносятся"""
+    try:
+        await write_atomic(QUEUES_IMPORTED_FILE_PATH, "")
 
     except Exception as e:
         logging.error(e)
@@ -60,12 +161,65 @@ async def load_bot_settings() -> BotSettings:
 
 
 async def save_bot_settings(settings: BotSettings) -> None:
-    """Сохраняет очереди в файл"""
+    """Атомарно сохраняет настройки бота в файл"""
     json_string: str = json.dumps(settings, indent=4)
     try:
-        async with aiofiles.open(BOT_SETTINGS_FILE_PATH, mode="w") as f:
-            await f.write(json_string)
+        await write_atomic(BOT_SETTINGS_FILE_PATH, json_string)
         logging.info("Bot settings saved to file")
 
     except Exception as e:
         logging.error(e)
+
+
+async def load_jobs() -> dict:
+    """Возвращает записи фоновых задач из файла"""
+    try:
+        async with aiofiles.open(JOBS_FILE_PATH, mode="r") as f:
+            string: str = await f.read()
+        data: dict = json.loads(string)
+        logging.info("Jobs loaded from file")
+        return data
+
+    except FileNotFoundError:
+        return dict()
+
+    except Exception as e:
+        logging.error(e)
+        return dict()
+
+
+async def save_jobs(data: dict) -> None:
+    """Атомарно сохраняет записи фоновых задач в файл"""
+    json_string: str = json.dumps(data, indent=4, ensure_ascii=False)
+    try:
+        await write_atomic(JOBS_FILE_PATH, json_string)
+
+    except Exception as e:
+        logging.error(e)
+
+
+async def load_live_messages() -> dict:
+    """Возвращает закрепленные сообщения с очередью и подписчиков из файла"""
+    try:
+        async with aiofiles.open(LIVE_MESSAGES_FILE_PATH, mode="r") as f:
+            string: str = await f.read()
+        data: dict = json.loads(string)
+        logging.info("Live messages loaded from file")
+        return data
+
+    except FileNotFoundError:
+        return dict()
+
+    except Exception as e:
+        logging.error(e)
+        return dict()
+
+
+async def save_live_messages(data: dict) -> None:
+    """Атомарно сохраняет закрепленные сообщения с очередью и подписчиков в файл"""
+    json_string: str = json.dumps(data, ensure_ascii=False)
+    try:
+        await write_atomic(LIVE_MESSAGES_FILE_PATH, json_string)
+
+    except Exception as e:
+        logging.error(e)
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+
+from bot.create_bot import bot
+from bot.db import get_all_trusted_users
+from bot.utils.broadcaster import Broadcaster, broadcaster
+from bot.utils.json_storage import load_live_messages, save_live_messages
+from bot.utils.messages import split_text
+from bot.utils.queue import QueueNotFoundError, queue_manager
+from bot.utils.refresh import RefreshScheduler
+from config import settings
+
+
+@dataclass
+class LiveMessage:
+    """Закрепленное сообщение с очередью в одном чате (длинная очередь — несколько сообщений)"""
+
+    message_ids: list[int] = field(default_factory=list)
+    """Id сообщений по порядку, первое закреплено"""
+    chunks: list[str] = field(default_factory=list)
+    """Текст, который сейчас показан в каждом сообщении"""
+
+
+class LiveQueueMessages:
+    """Показывает очередь в одном закрепленном сообщении на чат.
+    - Изменения редактируют это сообщение вместо отправки нового
+    - Части, текст которых не изменился, не редактируются
+    - Если количество частей изменилось или сообщение удалено, отправляется новое
+    - Запросы к Telegram проходят через общие лимиты рассылки
+    - Id сообщений и подписчики сохраняются в файл
+    """
+
+    def __init__(self, bot: Bot, limiter: Broadcaster) -> None:
+        self.bot: Bot = bot
+        self.limiter: Broadcaster = limiter
+        self.subscribers: set[int] = set()
+        """Чаты, в которых очередь обновляется автоматически"""
+        self._messages: dict[int, LiveMessage] = {}
+        self._locks: dict[int, asyncio.Lock] = {}
+        self._save_lock = asyncio.Lock()
+
+    def _lock(self, chat_id: int) -> asyncio.Lock:
+        lock: asyncio.Lock | None = self._locks.get(chat_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[chat_id] = lock
+        return lock
+
+    async def load(self) -> None:
+        """Загружает сообщения и подписчиков из файла"""
+        data: dict[str, Any] = await load_live_messages()
+        self.subscribers = set(data.get("subscribers", []))
+        self._messages = {
+            int(chat_id): LiveMessage(
+                message_ids=message["message_ids"], chunks=message["chunks"]
+            )
+            for chat_id, message in data.get("messages", {}).items()
+        }
+
+    async def save(self) -> None:
+        """Сохраняет сообщения и подписчиков в файл"""
+        async with self._save_lock:
+            await save_live_messages(
+                {
+                    "subscribers": sorted(self.subscribers),
+                    "messages": {
+                        str(chat_id): {
+                            "message_ids": message.message_ids,
+                            "chunks": message.chunks,
+                        }
+                        for chat_id, message in self._messages.items()
+                    },
+                }
+            )
+
+    async def subscribe(self, chat_id: int) -> None:
+        """Включает автоматическое обновление очереди в чате"""
+        self.subscribers.add(chat_id)
+        await self.save()
+
+    async def unsubscribe(self, chat_id: int) -> None:
+        """Выключает автоматическое обновление очереди в чате"""
+        self.subscribers.discard(chat_id)
+        await self.save()
+
+    async def show(self, chat_id: int, text: str, save: bool = True) -> None:
+        """Показывает текст в закрепленном сообщении чата
+        Args:
+            chat_id (int): Чат
+            text (str): Текст очереди любой длины
+            save (bool, optional): Сохранить ли изменения в файл сразу.
+            False — вызывающий сохранит сам (один раз на пачку чатов)
+        """
+        chunks: list[str] = split_text(text)
+        async with self._lock(chat_id):
+            live: LiveMessage | None = self._messages.get(chat_id)
+            if live is not None and live.chunks == chunks:
+                return
+            if live is None or len(live.message_ids) != len(chunks):
+                await self._replace(chat_id, live, chunks)
+            elif not await self._edit(chat_id, live, chunks):
+                await self._replace(chat_id, live, chunks)
+            if save:
+                await self.save()
+
+    async def _edit(self, chat_id: int, live: LiveMessage, chunks: list[str]) -> bool:
+        """Редактирует изменившиеся части
+        Returns:
+            bool: Удалось ли обновить все части
+        """
+        for index, (message_id, chunk) in enumerate(zip(live.message_ids, chunks)):
+            if live.chunks[index] == chunk:
+                continue
+            await self.limiter.acquire(chat_id)
+            try:
+                await self.bot.edit_message_text(
+                    text=chunk, chat_id=chat_id, message_id=message_id
+                )
+            except TelegramBadRequest as e:
+                if "message is not modified" not in e.message:
+                    # Сообщение удалено или слишком старое
+                    logging.warning(f"Live queue message was not edited: {e.message}")
+                    return False
+            live.chunks[index] = chunk
+        return True
+
+    async def _replace(
+        self, chat_id: int, old: LiveMessage | None, chunks: list[str]
+    ) -> None:
+        """Отправляет новые сообщения, закрепляет первое и удаляет старые"""
+        live = LiveMessage()
+        for chunk in chunks:
+            await self.limiter.acquire(chat_id)
+            message = await self.bot.send_message(chat_id=chat_id, text=chunk)
+            live.message_ids.append(message.message_id)
+            live.chunks.append(chunk)
+        self._messages[chat_id] = live
+        try:
+            await self.limiter.acquire(chat_id)
+            await self.bot.pin_chat_message(
+                chat_id=chat_id,
+                message_id=live.message_ids[0],
+                disable_notification=True,
+            )
+        except TelegramAPIError as e:
+            # Например, нет прав на закрепление в группе
+            logging.warning(f"Live queue message was not pinned: {e.message}")
+        if old is None or not old.message_ids:
+            return
+        try:
+            await self.limiter.acquire(chat_id)
+            await self.bot.unpin_chat_message(
+                chat_id=chat_id, message_id=old.message_ids[0]
+            )
+            await self.limiter.acquire(chat_id)
+            await self.bot.delete_messages(chat_id=chat_id, message_ids=old.message_ids)
+        except TelegramAPIError as e:
+            logging.warning(f"Old live queue message was not removed: {e.message}")
+
+
+class LiveQueuePush:
+    """Автоматическое обновление закрепленной очереди у подписчиков.
+    Изменения текущей очереди собираются за окно live_push_delay
+    и отправляются одной пачкой: только доверенным и только изменившиеся части
+    """
+
+    def __init__(self, live: LiveQueueMessages, delay: float) -> None:
+        self.live: LiveQueueMessages = live
+        self._refresher = RefreshScheduler(delay, self._push)
+
+    def schedule(self) -> None:
+        """Планирует обновление (вызывается при каждом изменении очередей)"""
+        if self.live.subscribers:
+            self._refresher.mark("current")
+
+    async def stop(self) -> None:
+        """Сразу отправляет запланированное обновление"""
+        await self._refresher.stop()
+
+    async def _push(self, keys: set[str]) -> None:
+        try:
+            text: str = await queue_manager.queue_show()
+        except QueueNotFoundError:
+            # Текущей очереди нет: закрепленные сообщения остаются как есть
+            return
+        trusted: set[int] = {user.tg_id for user in await get_all_trusted_users()}
+        chat_ids: list[int] = [
+            chat_id for chat_id in self.live.subscribers if chat_id in trusted
+        ]
+        semaphore = asyncio.Semaphore(settings.broadcast_concurrency)
+
+        async def push(chat_id: int) -> None:
+            async with semaphore:
+                await self._push_one(chat_id, text)
+
+        await asyncio.gather(*(push(chat_id) for chat_id in chat_ids))
+        # Показанный текст сохраняется один раз на пачку, а не после каждого чата
+        await self.live.save()
+
+    async def _push_one(self, chat_id: int, text: str) -> None:
+        try:
+            await self.live.show(chat_id, text, save=False)
+
+        except TelegramRetryAfter as e:
+            # Остальные обновления дождутся окончания flood control
+            self.live.limiter.pause(e.retry_after)
+            self.schedule()
+
+        except TelegramForbiddenError:
+            # Бот заблокирован: обновлять больше некуда
+            await self.live.unsubscribe(chat_id)
+
+        except Exception as e:
+            logging.error(e)
+
+
+# Экземпляры для импорта в других частях проекта
+live_queue = LiveQueueMessages(bot, broadcaster)
+live_push = LiveQueuePush(live_queue, settings.live_push_delay)
+queue_manager.subscribe_changes(live_push.schedule)
@@ -0,0 +1,73 @@
+from typing import Any
+
+from aiogram.types import Message
+
+MESSAGE_LIMIT = 4096
+"""Максимальная длина текста сообщения в Telegram"""
+
+
+def split_text(text: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    """Делит текст на части не длиннее limit по границам строк.
+    Строка длиннее limit делится по символам
+    Args:
+        text (str): Текст
+        limit (int, optional): Максимальная длина части. Defaults to MESSAGE_LIMIT.
+    Returns:
+        list[str]: Части текста по порядку
+    """
+    if len(text) <= limit:
+        return [text]
+    chunks: list[str] = []
+    lines: list[str] = []
+    size: int = 0
+    for line in text.split("\n"):
+        # Каждая строка в части, кроме первой, добавляет перенос
+        while len(line) > limit:
+            if lines:
+                chunks.append("\n".join(lines))
+                lines, size = [], 0
+            chunks.append(line[:limit])
+            line = line[limit:]
+        extra: int = len(line) + (1 if lines else 0)
+        if lines and size + extra > limit:
+            chunks.append("\n".join(lines))
+            lines, size, extra = [], 0, len(line)
+        lines.append(line)
+        size += extra
+    if lines:
+        chunks.append("\n".join(lines))
+    return [chunk for chunk in chunks if chunk.strip()] or [text[:limit]]
+
+
+def fitting_count(
+    lines: list[str], limit: int, reserved: int = 0, from_end: bool = False
+) -> int:
+    """Сколько строк подряд (с начала или с конца) помещается в одно сообщение
+    Args:
+        lines (list[str]): Строки, каждая без переноса в конце
+        limit (int): Максимальная длина текста
+        reserved (int, optional): Длина уже занятая заголовком. Defaults to 0.
+        from_end (bool, optional): Считать с конца списка. Defaults to False.
+    Returns:
+        int: Количество строк
+    """
+    size: int = reserved
+    count: int = 0
+    for line in reversed(lines) if from_end else lines:
+        size += len(line) + 1
+        if size > limit:
+            break
+        count += 1
+    return count
+
+
+async def answer_long(message: Message, text: str, **kwargs: Any) -> Message:
+    """Отвечает на сообщение текстом любой длины, несколькими сообщениями при необходимости.
+    Клавиатура и остальные параметры передаются только последнему сообщению
+    Returns:
+        Message: Последнее отправленное сообщение
+    """
+    chunks: list[str] = split_text(text)
+    for chunk in chunks[:-1]:
+        await message.answer(text=chunk)
+    return await message.answer(text=chunks[-1], **kwargs)
@@ -1,9 +1,48 @@
+import asyncio
+import json
 import logging
+from collections import deque
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
+from itertools import islice
 from random import shuffle
-
-from bot.db import User, get_all_trusted_users, get_user
-from bot.utils.json_storage import load_queues, save_queues
+from typing import Any, AsyncIterator, Callable, Coroutine, Iterable, Sequence
+from uuid import uuid4
+from weakref import WeakKeyDictionary
+
+from bot.db import (
+    Listener,
+    StoredQueue,
+    User,
+    advisory_lock,
+    get_all_trusted_users,
+    get_all_users,
+    get_stored_queues,
+    get_users_by_tg_ids,
+    notify,
+    on_commit,
+    outside_unit_of_work,
+    reload_users,
+)
+from bot.utils.queue_journal import QueuesData
+from bot.utils.queue_storage import (
+    DbQueueStorage,
+    QueueStorage,
+    create_queue_storage,
+)
+from bot.utils.refresh import RefreshScheduler
+from bot.utils.rendering import RenderStyle, render_member, render_queue
+from config import settings
+
+QUEUES_CHANNEL = "queues"
+"""Канал уведомлений об изменениях очередей между процессами"""
+QUEUES_LOCK_KEY = 7_113_101_117
+"""Ключ блокировки в бд, под которой процессы изменяют очереди"""
+
+
+class QueueNotFoundError(Exception):
+    """Очереди нет: не найдена по названию или текущая не установлена.
+    Текст ошибки готов для сообщения"""
 
 
 class Queue:
@@ -11,29 +50,76 @@ class Queue:
 
     def __init__(self, queue_name: str | None = None) -> None:
         """Инициализирует новый объект очереди"""
-        self._queue: list[int] = []
-        """Состоит из tg_id пользователей"""
-        self._cached_text: str = ""
-        """Кешированный подготовленный текст для сообщения (Имя очереди включено)"""
+        self._queue: deque[int] = deque()
+        """Состоит из tg_id пользователей (deque: циклический сдвиг без копирования)"""
+        self._lines: dict[int, str] = {}
+        """Подготовленные строки участников без номера по tg_id (Иван 🟢 @username)"""
+        self._desires: dict[int, bool] = {}
+        """Индекс желания участников по tg_id, обновляется вместе со строками"""
+        self._cached_text: str | None = None
+        """Кешированный подготовленный текст для сообщения (Имя очереди включено).
+        None, если текст нужно собрать заново из строк участников"""
         self._display_queue_name: str | None = queue_name
         """Название очереди, которое используется для вывода"""
+        self.lock = asyncio.Lock()
+        """Блокировка изменений очереди. Чтение текста ее не ждет:
+        изменения применяются без await между частями, поэтому текст всегда цельный"""
+        self._pending_next: int = 0
+        """Запрошенные, но еще не выполненные переходы к следующему желающему"""
+        self._positions: dict[int, int] | None = None
+        """Индекс позиций участников по tg_id, смещенный на _offset.
+        None, если индекс нужно собрать заново"""
+        self._offset: int = 0
+        """На сколько шагов очередь сдвинута с момента сборки индекса позиций"""
 
     def get_queue(self) -> list[int]:
         """Геттер для очереди
         Returns:
             list[int]: Очередь, состоит из tg_id пользователей
         """
-        return self._queue.copy()
+        return list(self._queue)
+
+    def size(self) -> int:
+        """Количество участников в очереди"""
+        return len(self._queue)
 
-    async def set_queue(self, tg_ids: list[int], queue_name: str | None = None) -> None:
+    def position(self, tg_id: int) -> int | None:
+        """Позиция участника в очереди (с 0) за O(1).
+        Циклический сдвиг индекс не сбрасывает, остальные изменения — сбрасывают
+        Args:
+            tg_id (int): Участник
+        Returns:
+            int | None: Позиция или None, если участника нет в очереди
+        """
+        if self._positions is None:
+            self._positions = {
+                member: index for index, member in enumerate(self._queue)
+            }
+            self._offset = 0
+        index: int | None = self._positions.get(tg_id)
+        if index is None:
+            return None
+        return (index - self._offset) % len(self._queue)
+
+    async def set_queue(
+        self,
+        tg_ids: list[int],
+        queue_name: str | None = None,
+        users: dict[int, User] | None = None,
+    ) -> None:
         """Сеттер для очереди
         Args:
             tg_ids (list[int]): Очередь, состоит из tg_id пользователей
+            users (dict[int, User] | None, optional): Заранее загруженные пользователи по tg_id
         """
-        self._queue = tg_ids
+        self._queue = deque(tg_ids)
+        self._positions = None
         if queue_name:
             self._display_queue_name = queue_name
-        await self.update_cached_text()
+        if users is not None:
+            self._render_lines(users)
+        await self._load_missing_lines()
+        self._cached_text = None
 
     def get_display_queue_name(self) -> str | None:
         """Геттер для названия очереди, которое используется для вывода"""
@@ -42,79 +128,181 @@ class Queue:
     async def init_from_db(self) -> None:
         """Наполняет очередь пользователями из бд"""
         users = await get_all_trusted_users()
-        self._queue = [user.tg_id for user in users]
-        await self.update_cached_text()
+        self._queue = deque(user.tg_id for user in users)
+        self._positions = None
+        await self.update_cached_text({user.tg_id: user for user in users})
 
-    async def replace(self, hwo: int, where: int):
+    async def replace(self, hwo: int, where: int) -> tuple[int, int]:
         """Переместить пользователя по индексу на место по индексу
 
         Args:
             hwo (int): Кого переместить (текущий индекс в очереди)
             where (int): Куда переместить
             например 5 – на 5 место
+        Returns:
+            tuple[int, int]: Фактические неотрицательные индексы (откуда, куда)
         """
-        self._queue.insert(where, self._queue.pop(hwo))
-        await self.update_cached_text()
+        tg_id: int = self._queue[hwo]
+        if hwo < 0:
+            hwo += len(self._queue)
+        del self._queue[hwo]
+        # Та же нормализация, что и у list.insert
+        if where < 0:
+            where = max(where + len(self._queue), 0)
+        where = min(where, len(self._queue))
+        self._queue.insert(where, tg_id)
+        self._positions = None
+        self._cached_text = None
+        return hwo, where
 
     async def shuffle(self) -> None:
         """Размешивает очередь в случайном порядке"""
-        shuffle(self._queue)
-        await self.update_cached_text()
+        # Перемешивание списка, а не deque: у deque доступ по индексу в середине O(n)
+        tg_ids: list[int] = list(self._queue)
+        shuffle(tg_ids)
+        self._queue = deque(tg_ids)
+        self._positions = None
+        self._cached_text = None
 
     def _move(self, steps: int = 1) -> None:
         """Циклический сдвиг очереди, без обновления кеша текста"""
         if not self._queue:
             return
         steps = steps % len(self._queue)
-        self._queue = self._queue[steps:] + self._queue[:steps]
+        # Сдвиг влево: первый в очереди становится последним
+        self._queue.rotate(-steps)
+        self._offset += steps
 
     async def move(self, steps: int = 1) -> None:
         """Циклический сдвиг очереди вперед или назад на заданное количество шагов"""
         self._move(steps=steps)
-        await self.update_cached_text()
+        self._cached_text = None
+
+    def request_next(self) -> None:
+        """Запоминает запрос перехода к следующему желающему.
+        Все запросы, накопленные до выполнения, выполняются одним сдвигом"""
+        self._pending_next += 1
+
+    def take_pending_next(self) -> int:
+        """Забирает накопленные запросы перехода
+        Returns:
+            int: Сколько переходов нужно выполнить
+        """
+        times, self._pending_next = self._pending_next, 0
+        return times
 
-    async def next_desiring(self) -> None:
+    async def next_desiring(self, times: int = 1) -> int:
         """Переходит к следующему желающему пользователю (has_desire=True), пропуская тех кто не желает.
         Использует циклический сдвиг (первый в очереди становится последним)
+        Args:
+            times (int, optional): Сколько переходов выполнить подряд. Defaults to 1.
+        Returns:
+            int: На сколько шагов сдвинута очередь
         """
-        if not self._queue:
-            return
-        for _ in range(len(self._queue)):
-            self._move(steps=1)
-            user: User | None = await get_user(self._queue[0])
-            if user is not None and user.has_desire:
-                await self.update_cached_text()
-                return
+        if not self._queue or times < 1:
+            return 0
+        # Актуальные желания всех участников одним запросом (или из кеша пользователей)
+        self._render_lines(await get_users_by_tg_ids(self._queue))
+        size: int = len(self._queue)
+        # Один проход: позиции желающих после первого, полный круг возвращает к первому
+        desiring: list[int] = [
+            steps
+            for steps, tg_id in enumerate(islice(self._queue, 1, None), start=1)
+            if self._desires.get(tg_id, False)
+        ]
+        if self._desires.get(self._queue[0], False):
+            desiring.append(size)
+        if not desiring:
+            return 0
+        # times переходов подряд — один сдвиг на times-го желающего по кругу
+        laps, index = divmod(times - 1, len(desiring))
+        steps: int = (desiring[index] + laps * size) % size
+        self._move(steps=steps)
+        self._cached_text = None
+        return steps
 
     def get_text(self) -> str:
-        """Возвращает подготовленный текст для сообщения из кеша"""
-        return self._cached_text
-
-    async def update_cached_text(self) -> None:
-        """Обновляет кешированный подготовленный текст для сообщения"""
-        self._cached_text = await self._build_queue_text(self._display_queue_name)
+        """Возвращает подготовленный текст для сообщения из кеша.
+        Если очередь менялась, текст собирается из готовых строк участников"""
+        if self._cached_text is None:
+            self.rebuild_text()
+        return self._cached_text  # type: ignore
+
+    def rebuild_text(self) -> None:
+        """Собирает текст из готовых строк участников"""
+        self._cached_text = render_queue(
+            self._display_queue_name, self._queue, self._lines, self._desires
+        )
 
-    async def _build_queue_text(self, queue_name: str | None) -> str:
-        """Возвращает список из пользователей в очереди
+    def update_user(self, user: User) -> bool:
+        """Перерисовывает строку одного участника, если он есть в очереди.
+        Текст не сбрасывается: его пересобирает планировщик обновлений
+        Args:
+            user (User): Обновленный пользователь
         Returns:
-            str: Текст со списком вида
-            1. Иван @username хочет
-            2. Максим @username не хочет
+            bool: Был ли пользователь в очереди
         """
-        if not queue_name:
-            queue_name = ""
-        users: list[User | None] = [await get_user(tg_id) for tg_id in self._queue]
-        if not users:
-            return f"✨ Очередь {queue_name} пуста ✨"
-        result: str = f"✨ Очередь {queue_name} ✨\n"
-        for index, user in enumerate(users):
-            if user is None:
-                logging.error("User in queue, but not in db")
-                continue
-            username: str = f"@{user.username}" if user.username is not None else ""
-            status: str = "🟢" if user.has_desire else "🔴"
-            result += f"{index + 1}. {user.name} {status} {username}\n"
-        return result
+        if user.tg_id not in self._lines:
+            return False
+        self._lines[user.tg_id] = render_member(user)
+        self._desires[user.tg_id] = user.has_desire
+        return True
+
+    async def update_cached_text(self, users: dict[int, User] | None = None) -> None:
+        """Полностью обновляет строки участников и кешированный текст
+        Args:
+            users (dict[int, User] | None, optional): Заранее загруженные пользователи по tg_id,
+            если не переданы, то загружаются одним запросом
+        """
+        if users is None:
+            users = await get_users_by_tg_ids(self._queue)
+        self._lines = {}
+        self._desires = {}
+        self._render_lines(users)
+        # Очередь могла измениться, пока загружались пользователи
+        await self._load_missing_lines()
+        self._cached_text = None
+
+    async def _load_missing_lines(self) -> None:
+        """Загружает одним запросом и подготавливает строки участников, для которых их еще нет"""
+        missing: list[int] = [
+            tg_id for tg_id in self._queue if tg_id not in self._lines
+        ]
+        if missing:
+            self._render_lines(await get_users_by_tg_ids(missing))
+
+    def _render_lines(self, users: dict[int, User]) -> None:
+        """Подготавливает строки и индекс желания для участников очереди из переданных пользователей"""
+        for tg_id in self._queue:
+            user: User | None = users.get(tg_id)
+            if user is not None:
+                self._lines[tg_id] = render_member(user)
+                self._desires[tg_id] = user.has_desire
+
+    def render(
+        self,
+        style: RenderStyle,
+        limit: int | None = None,
+        center: int | None = None,
+    ) -> str:
+        """Собирает текст очереди в выбранном виде (полный вид берется из кеша)
+        Args:
+            style (RenderStyle): Вид вывода
+            limit (int | None, optional): Сколько участников показать для RenderStyle.TOP
+            или сколько соседей с каждой стороны для RenderStyle.AROUND
+            center (int | None, optional): Позиция для RenderStyle.AROUND
+        """
+        if style is RenderStyle.FULL:
+            return self.get_text()
+        return render_queue(
+            self._display_queue_name,
+            self._queue,
+            self._lines,
+            self._desires,
+            style=style,
+            limit=limit,
+            center=center,
+        )
 
 
 @dataclass
@@ -136,6 +324,36 @@ class QueueManager:
     def __init__(self) -> None:
         self._queues: dict[str, Queue] = {}
         self._current_queue_name: str | None = None
+        self._storage: QueueStorage = create_queue_storage(settings.queue_storage)
+        """Хранилище, в которое сразу записывается каждое изменение очередей"""
+        self._autosave_task: asyncio.Task | None = None
+        self._shared: bool = settings.queue_shared
+        """Общий режим: очереди делят несколько процессов бота через Postgres"""
+        if self._shared and not isinstance(self._storage, DbQueueStorage):
+            logging.error(
+                "QUEUE_SHARED requires QUEUE_STORAGE=db, shared mode is disabled"
+            )
+            self._shared = False
+        self._worker_id: str = uuid4().hex
+        """Id процесса, чтобы не обрабатывать собственные уведомления"""
+        self._shared_lock = asyncio.Lock()
+        """Не дает изменениям и синхронизации внутри процесса пересекаться"""
+        self._listener: Listener = Listener(
+            QUEUES_CHANNEL,
+            self._on_notification,
+            on_reconnect=lambda: self._spawn(self._resync()),
+        )
+        self._sync_tasks: set[asyncio.Task] = set()
+        self._pending_user_notifications: WeakKeyDictionary[
+            asyncio.Task, list[int]
+        ] = WeakKeyDictionary()
+        """Пользователи, измененные в unit of work задачи: оповещение одно на коммит"""
+        self._refresher = RefreshScheduler(
+            settings.queue_refresh_delay, self._rebuild_texts
+        )
+        """Пересобирает текст очередей после изменений пользователей раз в окно"""
+        self._change_listeners: list[Callable[[], None]] = []
+        """Подписчики на возможное изменение текста текущей очереди"""
 
     def _get_queue_context(self, queue_name: str | None = None) -> GetQueueContext:
         """Возвращает результат поиска, контекст.
@@ -174,10 +392,13 @@ class QueueManager:
             if add_at_start:
                 text = add_at_start + "\n" + text
             return text
-        elif is_current:
+        return self._missing_queue_text(is_current)
+
+    @staticmethod
+    def _missing_queue_text(is_current: bool) -> str:
+        if is_current:
             return "❌ Текущая очередь не установлена"
-        else:
-            return "❌ Очередь не найдена"
+        return "❌ Очередь не найдена"
 
     # region Queues
 
@@ -190,16 +411,20 @@ class QueueManager:
 
         if queue_name is None:
             return "❌ Введи название очереди"
-        if queue_name in self._queues:
-            return "❌ Очередь с таким именем уже существует"
+        async with self._mutation(queue_name):
+            if queue_name in self._queues:
+                return "❌ Очередь с таким именем уже существует"
 
-        if not display_queue_name:
-            display_queue_name = queue_name
+            if not display_queue_name:
+                display_queue_name = queue_name
 
-        queue = Queue(display_queue_name)
-        await queue.init_from_db()
-        self._queues[queue_name] = queue
-        self._current_queue_name = queue_name
+            queue = Queue(display_queue_name)
+            await queue.init_from_db()
+            self._queues[queue_name] = queue
+            self._current_queue_name = queue_name
+            self._storage.record_set(queue_name, queue.get_queue())
+            self._storage.record_current(queue_name)
+            await self._storage.flush()
 
         return self._build_queue_report(
             queue=queue,
@@ -214,20 +439,27 @@ class QueueManager:
 
         if queue_name is None:
             return "❌ Введи название очереди"
-        if queue_name in self._queues:
-            return "❌ Очередь с таким именем уже существует"
+        async with self._mutation(queue_name):
+            if queue_name in self._queues:
+                return "❌ Очередь с таким именем уже существует"
 
-        if not display_queue_name:
-            display_queue_name = queue_name
+            if not display_queue_name:
+                display_queue_name = queue_name
 
-        current_context = self._get_queue_context()
-        if not current_context.queue:
-            return "❌ Текущая очередь не установлена"
+            current_context = self._get_queue_context()
+            if not current_context.queue:
+                return "❌ Текущая очередь не установлена"
 
-        queue = Queue(display_queue_name)
-        await queue.set_queue(current_context.queue.get_queue(), queue_name=queue_name)
-        self._queues[queue_name] = queue
-        self._current_queue_name = queue_name
+            tg_ids: list[int] = current_context.queue.get_queue()
+            queue = Queue(display_queue_name)
+            await queue.set_queue(
+                tg_ids, queue_name=queue_name, users=await get_users_by_tg_ids(tg_ids)
+            )
+            self._queues[queue_name] = queue
+            self._current_queue_name = queue_name
+            self._storage.record_set(queue_name, tg_ids)
+            self._storage.record_current(queue_name)
+            await self._storage.flush()
 
         return self._build_queue_report(
             queue=queue,
@@ -235,16 +467,32 @@ class QueueManager:
             add_at_start=f"⚙️ Очередь {current_context.queue_name} скопирована",
         )
 
-    def delete_queue(self, queue_name: str | None = None) -> str:
+    async def delete_queue(self, queue_name: str | None = None) -> str:
         """Удаляет очередь"""
-        context = self._get_queue_context(queue_name=queue_name)
-        if not context.queue or not context.queue_name:
-            return "❌ Очередь не найдена"
-        if context.is_current:
-            self._current_queue_name = None
-        del self._queues[context.queue_name]
+        async with self._mutation(queue_name):
+            context = self._get_queue_context(queue_name=queue_name)
+            if not context.queue or not context.queue_name:
+                return "❌ Очередь не найдена"
+            # Дожидается изменений очереди, которые уже выполняются
+            async with context.queue.lock:
+                if self._queues.get(context.queue_name) is not context.queue:
+                    return "❌ Очередь не найдена"
+                if self._current_queue_name == context.queue_name:
+                    self._current_queue_name = None
+                    self._storage.record_current(None)
+                del self._queues[context.queue_name]
+                self._storage.record_delete(context.queue_name)
+                await self._storage.flush()
         return f"⚙️ Очередь {context.queue_name} удалена"
 
+    def has_queue(self, queue_name: str | None = None) -> bool:
+        """Есть ли очередь (по умолчанию — установлена ли текущая)"""
+        return self._get_queue_context(queue_name).queue is not None
+
+    def is_current_queue(self, queue_name: str | None = None) -> bool:
+        """Является ли очередь текущей (без имени — всегда текущая)"""
+        return self._get_queue_context(queue_name).is_current
+
     def get_queue_names(self) -> str:
         """Возвращает список названий всех очередей"""
         text = ", ".join(list(self._queues.keys()))
@@ -261,14 +509,18 @@ class QueueManager:
 
     async def set_current_queue(self, queue_name: str | None) -> str:
         """Устанавливает очередь текущей по ее названию"""
-        cxt = self._get_queue_context(queue_name=queue_name)
-        if not cxt.queue or queue_name is None:
-            return "❌ Такой очереди нет"
-        if cxt.is_current:
-            return "❌ Эта очередь уже является текущей"
-
-        self._current_queue_name = queue_name
-        await cxt.queue.update_cached_text()
+        async with self._mutation(queue_name):
+            cxt = self._get_queue_context(queue_name=queue_name)
+            if not cxt.queue or queue_name is None:
+                return "❌ Такой очереди нет"
+            if cxt.is_current:
+                return "❌ Эта очередь уже является текущей"
+
+            self._current_queue_name = queue_name
+            self._storage.record_current(queue_name)
+            await self._storage.flush()
+        async with cxt.queue.lock:
+            await cxt.queue.update_cached_text()
 
         return self._build_queue_report(
             queue=cxt.queue,
@@ -280,28 +532,73 @@ class QueueManager:
 
     # region Queue
     async def queue_replace(self, hwo: int, where: int, queue_name: str | None = None):
-        cxt = self._get_queue_context(queue_name)
-        if cxt.queue and cxt.queue_name:
-            try:
-                await cxt.queue.replace(hwo, where)
-            except IndexError:
-                return "❌ Неправильный индекс"
+        async with self._mutation(queue_name):
+            cxt = self._get_queue_context(queue_name)
+            moved_from, moved_to = hwo, where
+            if cxt.queue and cxt.queue_name:
+                async with cxt.queue.lock:
+                    # IndexError пробрасывается: обработчик ответит ошибкой, а не отчетом
+                    moved_from, moved_to = await cxt.queue.replace(hwo, where)
+                    self._storage.record_replace(cxt.queue_name, moved_from, moved_to)
+                    await self._storage.flush()
+        # Фактические места: отрицательные и слишком большие индексы уже нормализованы
         return self._build_queue_report(
             queue=cxt.queue,
             is_current=cxt.is_current,
-            add_at_start=f"⚙️ Пользователь перемещен с {hwo + 1} на {where + 1}",
+            add_at_start=f"⚙️ Пользователь перемещен с {moved_from + 1} на {moved_to + 1}",
         )
 
-    async def queue_show(self, queue_name: str | None = None) -> str:
-        """Возвращает текстовое представление очереди"""
+    async def queue_show(
+        self,
+        queue_name: str | None = None,
+        style: RenderStyle = RenderStyle.FULL,
+        size: int | None = None,
+        tg_id: int | None = None,
+    ) -> str:
+        """Возвращает текстовое представление очереди
+        Args:
+            queue_name (str | None, optional): Очередь, по умолчанию текущая
+            style (RenderStyle, optional): Вид вывода
+            size (int | None, optional): Сколько участников для RenderStyle.TOP
+            или соседей для RenderStyle.AROUND, по умолчанию из настроек
+            tg_id (int | None, optional): Чье место показать для RenderStyle.AROUND
+        Raises:
+            QueueNotFoundError: Очереди нет (или текущая не установлена)
+        """
         cxt = self._get_queue_context(queue_name)
-        return self._build_queue_report(queue=cxt.queue, is_current=cxt.is_current)
+        if cxt.queue is None:
+            raise QueueNotFoundError(self._missing_queue_text(cxt.is_current))
+        if style is RenderStyle.FULL:
+            return cxt.queue.get_text()
+
+        if style is RenderStyle.TOP:
+            return cxt.queue.render(style, limit=size or settings.queue_top_size)
+        if style is RenderStyle.AROUND:
+            position: int | None = (
+                cxt.queue.position(tg_id) if tg_id is not None else None
+            )
+            if position is None:
+                text: str = cxt.queue.render(
+                    RenderStyle.TOP, limit=settings.queue_top_size
+                )
+                return "📍 Тебя нет в этой очереди\n" + text
+            text = cxt.queue.render(
+                style,
+                limit=size if size is not None else settings.queue_around_size,
+                center=position,
+            )
+            return f"📍 Твое место: {position + 1} из {cxt.queue.size()}\n" + text
+        return cxt.queue.render(style)
 
     async def queue_shuffle(self, queue_name: str | None = None) -> str:
         """Перемешивает очередь"""
-        cxt = self._get_queue_context(queue_name)
-        if cxt.queue and cxt.queue_name:
-            await cxt.queue.shuffle()
+        async with self._mutation(queue_name):
+            cxt = self._get_queue_context(queue_name)
+            if cxt.queue and cxt.queue_name:
+                async with cxt.queue.lock:
+                    await cxt.queue.shuffle()
+                    self._storage.record_set(cxt.queue_name, cxt.queue.get_queue())
+                    await self._storage.flush()
         return self._build_queue_report(
             queue=cxt.queue,
             is_current=cxt.is_current,
@@ -309,10 +606,24 @@ class QueueManager:
         )
 
     async def queue_next_desiring(self, queue_name: str | None = None) -> str:
-        """Переходит к следующему желающему в очереди"""
-        cxt = self._get_queue_context(queue_name)
-        if cxt.queue and cxt.queue_name:
-            await cxt.queue.next_desiring()
+        """Переходит к следующему желающему в очереди.
+        Одновременные запросы объединяются: один сдвиг, одна запись и одна сборка текста
+        """
+        requested: Queue | None = self._get_queue_context(queue_name).queue
+        if requested is not None:
+            requested.request_next()
+        async with self._mutation(queue_name):
+            cxt = self._get_queue_context(queue_name)
+            if cxt.queue and cxt.queue_name:
+                if cxt.queue is not requested:
+                    cxt.queue.request_next()
+                async with cxt.queue.lock:
+                    # Запрос мог уже выполнить тот, кто раньше занял блокировку
+                    times: int = cxt.queue.take_pending_next()
+                    if times:
+                        steps: int = await cxt.queue.next_desiring(times)
+                        self._storage.record_move(cxt.queue_name, steps)
+                        await self._storage.flush()
         return self._build_queue_report(
             queue=cxt.queue,
             is_current=cxt.is_current,
@@ -321,9 +632,13 @@ class QueueManager:
 
     async def queue_init(self, queue_name: str | None = None) -> str:
         """Инициализирует очередь пользователями из бд"""
-        cxt = self._get_queue_context(queue_name)
-        if cxt.queue and cxt.queue_name:
-            await cxt.queue.init_from_db()
+        async with self._mutation(queue_name):
+            cxt = self._get_queue_context(queue_name)
+            if cxt.queue and cxt.queue_name:
+                async with cxt.queue.lock:
+                    await cxt.queue.init_from_db()
+                    self._storage.record_set(cxt.queue_name, cxt.queue.get_queue())
+                    await self._storage.flush()
         return self._build_queue_report(
             queue=cxt.queue,
             is_current=cxt.is_current,
@@ -334,7 +649,9 @@ class QueueManager:
         """Обновляет кешированный подготовленный текст для сообщения ТОЛЬКО у одной очереди"""
         cxt = self._get_queue_context(queue_name)
         if cxt.queue and cxt.queue_name:
-            await cxt.queue.update_cached_text()
+            async with cxt.queue.lock:
+                await cxt.queue.update_cached_text()
+            self._changed()
         return self._build_queue_report(
             queue=cxt.queue,
             is_current=cxt.is_current,
@@ -343,31 +660,266 @@ class QueueManager:
 
     async def queue_move(self, queue_name: str | None = None, steps: int = 1) -> str:
         """Циклический сдвиг очереди вперед или назад на заданное количество шагов"""
-        cxt: GetQueueContext = self._get_queue_context(queue_name)
-        if cxt.queue and cxt.queue_name:
-            await cxt.queue.move(steps)
+        async with self._mutation(queue_name):
+            cxt: GetQueueContext = self._get_queue_context(queue_name)
+            if cxt.queue and cxt.queue_name:
+                async with cxt.queue.lock:
+                    await cxt.queue.move(steps)
+                    self._storage.record_move(cxt.queue_name, steps)
+                    await self._storage.flush()
         return self._build_queue_report(
             queue=cxt.queue,
             is_current=cxt.is_current,
             add_at_start=f"⚙️ Очередь сдвинута вперед на {steps} шаг(ов)",
         )
 
+    def refresh_user(self, user: User) -> None:
+        """Перерисовывает строку пользователя во всех очередях, где он есть.
+        Текст очередей пересобирается один раз за окно queue_refresh_delay.
+        В общем режиме после коммита оповещает другие процессы:
+        одним уведомлением на всех пользователей, измененных в unit of work"""
+        self._refresh_user_lines(user)
+        if not self._shared:
+            return
+        task: asyncio.Task | None = asyncio.current_task()
+        if task is None:
+            self._spawn(self._notify(users=[user.tg_id]))
+            return
+        pending: list[int] | None = self._pending_user_notifications.get(task)
+        if pending is not None:
+            pending.append(user.tg_id)
+            return
+        self._pending_user_notifications[task] = [user.tg_id]
+        on_commit(lambda: self._notify_users_committed(task))
+
+    def _notify_users_committed(self, task: asyncio.Task) -> None:
+        tg_ids: list[int] = self._pending_user_notifications.pop(task, [])
+        if tg_ids:
+            self._spawn(self._notify(users=tg_ids))
+
+    def _refresh_user_lines(self, user: User) -> None:
+        for queue_name, queue in self._queues.items():
+            if queue.update_user(user):
+                self._refresher.mark(queue_name)
+
+    def rebuild_current_text(self) -> None:
+        """Сразу пересобирает текст текущей очереди из уже обновленных строк.
+        Для ответа тому, кто ее изменил; остальное пересоберет планировщик"""
+        queue: Queue | None = self._get_queue_context().queue
+        if queue is not None:
+            queue.rebuild_text()
+
+    async def _rebuild_texts(self, names: set[str]) -> None:
+        for name in names:
+            queue: Queue | None = self._queues.get(name)
+            if queue is not None:
+                queue.rebuild_text()
+        if self._current_queue_name in names:
+            self._changed()
+
+    def subscribe_changes(self, listener: Callable[[], None]) -> None:
+        """Подписывает функцию на возможные изменения текста текущей очереди.
+        Вызывается после каждого изменения очередей, поэтому должна быть дешевой
+        Args:
+            listener (Callable[[], None]): Синхронная функция без аргументов
+        """
+        self._change_listeners.append(listener)
+
+    def _changed(self) -> None:
+        for listener in self._change_listeners:
+            try:
+                listener()
+            except Exception as e:
+                logging.error(e)
+
+    # endregion
+
+    # region Shared mode
+    @asynccontextmanager
+    async def _mutation(self, queue_name: str | None = None) -> AsyncIterator[None]:
+        """Изменение очередей.
+        В общем режиме выполняется под блокировкой в бд на свежем состоянии очереди,
+        изменения коммитятся до снятия блокировки, другие процессы получают уведомление
+        Args:
+            queue_name (str | None, optional): Изменяемая очередь. Defaults to None — текущая
+        """
+        if not self._shared:
+            try:
+                yield
+            finally:
+                self._changed()
+            return
+
+        names: set[str] = {queue_name} if queue_name else set()
+        async with self._shared_lock, advisory_lock(QUEUES_LOCK_KEY):
+            # Свои сессии: изменения должны попасть в бд до снятия блокировки
+            with outside_unit_of_work():
+                await self._sync_queues(names)
+                names.add(self._current_queue_name or "")
+                try:
+                    yield
+                finally:
+                    if self._storage.dirty:
+                        # Изменение не записано: состояние в памяти возвращается к бд
+                        self._storage.discard()
+                        await self._sync_queues(names)
+                    names.add(self._current_queue_name or "")
+                    names.discard("")
+                    await self._notify(names=names)
+                    self._changed()
+
+    async def _sync_queues(self, names: Iterable[str] | None) -> None:
+        """Перечитывает из бд указанные очереди и текущую очередь.
+        Если бд недоступна, очереди в памяти не меняются
+        Args:
+            names (Iterable[str] | None): Названия очередей, None — все очереди
+        """
+        wanted: set[str] | None = set(names) if names is not None else None
+        stored: Sequence[StoredQueue] | None = await get_stored_queues(names=wanted)
+        if stored is None:
+            logging.error("Queues were not synchronized from db, local state kept")
+            return
+        found: dict[str, StoredQueue] = {queue.name: queue for queue in stored}
+        if wanted is None:
+            wanted = set(self._queues)
+        for name in wanted - found.keys():
+            self._queues.pop(name, None)
+        for name, stored_queue in found.items():
+            tg_ids: list[int] = [member.tg_id for member in stored_queue.members]
+            queue: Queue | None = self._queues.get(name)
+            if queue is None:
+                queue = Queue(name)
+                self._queues[name] = queue
+            elif queue.get_queue() == tg_ids:
+                continue
+            await queue.set_queue(tg_ids)
+        self._current_queue_name = next(
+            (queue.name for queue in stored if queue.is_current), None
+        )
+
+    async def _notify(
+        self, names: Iterable[str] = (), users: Iterable[int] = ()
+    ) -> None:
+        """Оповещает другие процессы об измененных очередях и пользователях"""
+        payload: dict[str, Any] = {
+            "origin": self._worker_id,
+            "names": list(names),
+            "users": list(users),
+        }
+        try:
+            await notify(QUEUES_CHANNEL, json.dumps(payload))
+        except Exception as e:
+            logging.error(e)
+
+    def _on_notification(self, payload: str) -> None:
+        data: dict[str, Any] = json.loads(payload)
+        if data.get("origin") == self._worker_id:
+            return
+        self._spawn(self._apply_notification(data))
+
+    async def _apply_notification(self, data: dict[str, Any]) -> None:
+        """Обновляет очереди и строки пользователей, измененные другим процессом"""
+        try:
+            async with self._shared_lock:
+                if data.get("names"):
+                    await self._sync_queues(data["names"])
+                    self._changed()
+                if data.get("users"):
+                    users: dict[int, User] = await reload_users(data["users"])
+                    for user in users.values():
+                        self._refresh_user_lines(user)
+        except Exception as e:
+            logging.error(e)
+
+    async def _resync(self) -> None:
+        """Полная синхронизация после потери уведомлений (переподключение LISTEN):
+        все очереди и все пользователи перечитываются из бд"""
+        try:
+            async with self._shared_lock:
+                with outside_unit_of_work():
+                    await self._sync_queues(None)
+                    tg_ids: list[int] = [user.tg_id for user in await get_all_users()]
+                    # Оповещает подписчиков (кеш доверия) о каждом пользователе
+                    users: dict[int, User] = await reload_users(tg_ids)
+                for queue in self._queues.values():
+                    await queue.update_cached_text(users)
+                self._changed()
+            logging.info("Queues and users resynchronized from db")
+        except Exception as e:
+            logging.error(e)
+
+    def _spawn(self, coroutine: Coroutine[Any, Any, None]) -> None:
+        task: asyncio.Task = asyncio.create_task(coroutine)
+        self._sync_tasks.add(task)
+        task.add_done_callback(self._sync_tasks.discard)
+
+    async def start_sync(self) -> None:
+        """Начинает получать изменения очередей от других процессов (общий режим)"""
+        if self._shared:
+            await self._listener.start()
+
+    async def stop_sync(self) -> None:
+        """Перестает получать изменения очередей от других процессов"""
+        await self._listener.stop()
+        await asyncio.gather(*self._sync_tasks, return_exceptions=True)
+
     # endregion
 
     async def load_from_file(self) -> None:
-        """Подгружает очереди из файла"""
-        queues_dict: dict[str, list[int]] = await load_queues()
+        """Подгружает очереди из хранилища (бд или файл: снимок + журнал изменений)"""
+        queues_dict: QueuesData = await self._storage.load()
+        # Один запрос на все очереди вместо запроса на каждого участника
+        users: dict[int, User] = await get_users_by_tg_ids(
+            tg_id for tg_ids in queues_dict.values() for tg_id in tg_ids
+        )
         for queue_name, tg_ids in queues_dict.items():
             queue = Queue(queue_name)
-            await queue.set_queue(tg_ids, queue_name=queue_name)
+            await queue.set_queue(tg_ids, queue_name=queue_name, users=users)
             self._queues[queue_name] = queue
-
-    async def save_to_file(self) -> None:
-        """Сохраняет очереди в файл"""
-        data_for_save: dict[str, list[int]] = {}
+        current: str | None = await self._storage.load_current_queue_name()
+        if current in self._queues:
+            self._current_queue_name = current
+        self._changed()
+
+    def _get_snapshot(self) -> QueuesData:
+        """Возвращает текущее состояние всех очередей для сохранения"""
+        data_for_save: QueuesData = {}
         for queue_name, queue in self._queues.items():
             data_for_save[queue_name] = queue.get_queue()
-        await save_queues(data=data_for_save)
+        return data_for_save
+
+    async def save_to_file(self) -> None:
+        """Сохраняет снимок очередей в хранилище
+        (для файла — атомарно, с очисткой журнала изменений)"""
+        if self._shared:
+            # Снимок одного процесса перезаписал бы изменения других,
+            # а каждое изменение и так записано в бд под блокировкой
+            await self._storage.flush()
+            return
+        await self._storage.compact(self._get_snapshot)
+
+    def start_autosave(self, interval: float) -> None:
+        """Запускает периодическое сохранение снимка очередей"""
+        if self._autosave_task is None and interval > 0:
+            self._autosave_task = asyncio.create_task(self._autosave(interval))
+
+    async def stop_autosave(self) -> None:
+        """Останавливает периодическое сохранение снимка очередей"""
+        await self._refresher.stop()
+        if self._autosave_task is None:
+            return
+        self._autosave_task.cancel()
+        await asyncio.gather(self._autosave_task, return_exceptions=True)
+        self._autosave_task = None
+
+    async def _autosave(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            if self._storage.dirty:
+                try:
+                    await self.save_to_file()
+                except Exception as e:
+                    logging.error(e)
 
 
 # Экземпляр для импорта в других частях проекта
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+from typing import Any, Callable
+
+from bot.utils.json_storage import (
+    append_queues_log,
+    clear_queues_log,
+    load_queues,
+    load_queues_log,
+    save_queues,
+)
+
+QueuesData = dict[str, list[int]]
+"""Название очереди -> tg_id участников по порядку"""
+
+
+def replay_queues_log(
+    snapshot: QueuesData, records: list[dict[str, Any]], applied_seq: int = 0
+) -> QueuesData:
+    """Применяет записи журнала к снимку очередей
+    Args:
+        snapshot (QueuesData): Снимок очередей
+        records (list[dict[str, Any]]): Записи журнала по порядку
+        applied_seq (int, optional): Номер последней записи, уже вошедшей в снимок.
+        Записи с номером не больше него пропускаются
+    Returns:
+        QueuesData: Состояние очередей после всех записей
+    """
+    queues: QueuesData = {name: list(tg_ids) for name, tg_ids in snapshot.items()}
+    for record in records:
+        try:
+            seq = record.get("seq")
+            if isinstance(seq, int) and seq <= applied_seq:
+                # Журнал не очистился после снимка: запись уже применена
+                continue
+            op = record.get("op")
+            name = record.get("name")
+            if not isinstance(name, str):
+                logging.error(f"Queues log record without name skipped: {record}")
+                continue
+            if op == "set":
+                queues[name] = list(record["queue"])
+            elif op == "delete":
+                queues.pop(name, None)
+            elif op == "move":
+                queue: list[int] = queues[name]
+                if queue:
+                    steps: int = record["steps"] % len(queue)
+                    queues[name] = queue[steps:] + queue[:steps]
+            elif op == "replace":
+                queue = queues[name]
+                queue.insert(record["where"], queue.pop(record["hwo"]))
+            else:
+                logging.error(f"Unknown queues log record: {record}")
+        except (AttributeError, KeyError, IndexError, TypeError) as e:
+            logging.error(f"Queues log record {record} skipped: {e!r}")
+    return queues
+
+
+class QueueJournal:
+    """Журнал изменений очередей (write-ahead log) со снимками.
+    - Изменения записываются синхронно в буфер в момент мутации, затем сбрасываются на диск
+    - Снимок пишется атомарно, после чего журнал очищается
+    - При загрузке снимок дополняется записями журнала
+    - Записи нумеруются, а снимок хранит номер последней вошедшей в него записи,
+    поэтому журнал, не очищенный после снимка, не применяется повторно
+    """
+
+    def __init__(self) -> None:
+        self._buffer: list[dict[str, Any]] = []
+        """Записи, еще не сброшенные на диск"""
+        self._seq: int = 0
+        """Номер последней записи"""
+        self._dirty: bool = False
+        """Были ли изменения после последнего снимка"""
+        self._lock = asyncio.Lock()
+
+    @property
+    def dirty(self) -> bool:
+        """Были ли изменения после последнего снимка"""
+        return self._dirty
+
+    async def load(self) -> QueuesData:
+        """Возвращает очереди: снимок + записи журнала"""
+        async with self._lock:
+            snapshot, applied_seq = await load_queues()
+            records: list[dict[str, Any]] = await load_queues_log()
+            self._buffer.clear()
+            self._seq = max(
+                [applied_seq]
+                + [r["seq"] for r in records if isinstance(r.get("seq"), int)]
+            )
+            self._dirty = bool(records)
+            return replay_queues_log(snapshot, records, applied_seq)
+
+    async def load_current_queue_name(self) -> str | None:
+        """Текущая очередь в файле не хранится"""
+        return None
+
+    def record_set(self, name: str, tg_ids: list[int]) -> None:
+        """Очередь создана или ее порядок полностью заменен"""
+        self._record({"op": "set", "name": name, "queue": tg_ids})
+
+    def record_delete(self, name: str) -> None:
+        """Очередь удалена"""
+        self._record({"op": "delete", "name": name})
+
+    def record_move(self, name: str, steps: int) -> None:
+        """Циклический сдвиг очереди"""
+        if steps:
+            self._record({"op": "move", "name": name, "steps": steps})
+
+    def record_replace(self, name: str, hwo: int, where: int) -> None:
+        """Перемещение участника"""
+        self._record({"op": "replace", "name": name, "hwo": hwo, "where": where})
+
+    def record_current(self, name: str | None) -> None:
+        """Текущая очередь в файле не хранится"""
+
+    def _record(self, record: dict[str, Any]) -> None:
+        self._seq += 1
+        record["seq"] = self._seq
+        self._buffer.append(record)
+        self._dirty = True
+
+    async def flush(self) -> None:
+        """Сбрасывает накопленные записи в журнал на диске"""
+        async with self._lock:
+            if not self._buffer:
+                return
+            # Буфер забирается целиком без await, чтобы записи не потерялись и не задвоились
+            records, self._buffer = self._buffer, []
+            try:
+                await append_queues_log(records)
+            except Exception as e:
+                logging.error(e)
+                self._buffer = records + self._buffer
+
+    def discard(self) -> None:
+        """Отбрасывает записи, еще не сброшенные в журнал"""
+        self._buffer.clear()
+
+    async def compact(self, get_snapshot: Callable[[], QueuesData]) -> None:
+        """Сохраняет снимок и очищает журнал
+        Args:
+            get_snapshot (Callable[[], QueuesData]): Возвращает текущее состояние очередей,
+            вызывается под блокировкой журнала
+        """
+        async with self._lock:
+            # Снимок уже включает все записи буфера
+            snapshot: QueuesData = get_snapshot()
+            seq: int = self._seq
+            buffer, self._buffer = self._buffer, []
+            self._dirty = False
+            if not await save_queues(snapshot, seq):
+                # Снимок не сохранен: записи буфера все еще нужно записать в журнал
+                self._buffer = buffer + self._buffer
+                self._dirty = True
+                return
+            try:
+                await clear_queues_log()
+            except Exception as e:
+                # Оставшиеся записи журнала пропустятся при загрузке по номеру снимка
+                logging.error(e)
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from typing import Any, Callable, Protocol, Sequence
+
+from bot.db import StoredQueue, apply_queue_ops, get_stored_queues
+from bot.utils.json_storage import is_queues_imported, mark_queues_imported
+from bot.utils.queue_journal import QueueJournal, QueuesData
+
+
+class QueueStorage(Protocol):
+    """Хранилище очередей, в которое QueueManager записывает каждое изменение.
+    - record_* синхронно запоминают изменение в момент мутации
+    - flush записывает накопленные изменения
+    - discard отбрасывает изменения, которые не удалось записать
+    """
+
+    @property
+    def dirty(self) -> bool: ...
+
+    async def load(self) -> QueuesData: ...
+
+    async def load_current_queue_name(self) -> str | None: ...
+
+    def record_set(self, name: str, tg_ids: list[int]) -> None: ...
+
+    def record_delete(self, name: str) -> None: ...
+
+    def record_move(self, name: str, steps: int) -> None: ...
+
+    def record_replace(self, name: str, hwo: int, where: int) -> None: ...
+
+    def record_current(self, name: str | None) -> None: ...
+
+    async def flush(self) -> None: ...
+
+    def discard(self) -> None: ...
+
+    async def compact(self, get_snapshot: Callable[[], QueuesData]) -> None: ...
+
+
+class DbQueueStorage:
+    """Хранилище очередей в Postgres (таблицы queues и queue_members).
+    Каждое изменение записывается сразу, одним bulk-запросом на изменение
+    """
+
+    def __init__(self) -> None:
+        self._buffer: list[dict[str, Any]] = []
+        """Изменения, еще не записанные в бд"""
+        self._current_queue_name: str | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def dirty(self) -> bool:
+        """Есть ли изменения, еще не записанные в бд"""
+        return bool(self._buffer)
+
+    async def load(self) -> QueuesData:
+        """Возвращает очереди из бд.
+        Очереди из json-файла переносятся один раз: при первом запуске с пустой бд.
+        После переноса (или если бд уже заполнена) ставится отметка,
+        чтобы удаленные очереди не вернулись из файла при перезапуске"""
+        queues: Sequence[StoredQueue] | None = await get_stored_queues()
+        if queues is None:
+            # Пустые очереди в памяти затерли бы бд при следующем сохранении
+            raise RuntimeError("Queues were not loaded from db")
+        imported: bool = await is_queues_imported()
+        if not queues and not imported:
+            return await self._import_from_file()
+        if not imported:
+            await mark_queues_imported()
+        self._current_queue_name = next(
+            (queue.name for queue in queues if queue.is_current), None
+        )
+        return {
+            queue.name: [member.tg_id for member in queue.members] for queue in queues
+        }
+
+    async def _import_from_file(self) -> QueuesData:
+        """Переносит очереди из json-файла (снимок + журнал) в бд"""
+        data: QueuesData = await QueueJournal().load()
+        for name, tg_ids in data.items():
+            self.record_set(name, tg_ids)
+        await self.flush()
+        if self.dirty:
+            # Отметка не ставится: перенос повторится при следующем запуске
+            logging.error("Queues were not imported from file to db")
+            return data
+        await mark_queues_imported()
+        if data:
+            logging.info(f"{len(data)} queues imported from file to db")
+        return data
+
+    async def load_current_queue_name(self) -> str | None:
+        """Возвращает название текущей очереди, загруженное вместе с очередями"""
+        return self._current_queue_name
+
+    def record_set(self, name: str, tg_ids: list[int]) -> None:
+        """Очередь создана или ее порядок полностью заменен"""
+        self._buffer.append({"op": "set", "name": name, "queue": tg_ids})
+
+    def record_delete(self, name: str) -> None:
+        """Очередь удалена"""
+        self._buffer.append({"op": "delete", "name": name})
+
+    def record_move(self, name: str, steps: int) -> None:
+        """Циклический сдвиг очереди"""
+        if steps:
+            self._buffer.append({"op": "move", "name": name, "steps": steps})
+
+    def record_replace(self, name: str, hwo: int, where: int) -> None:
+        """Перемещение участника (позиции нормализованы)"""
+        self._buffer.append(
+            {"op": "replace", "name": name, "hwo": hwo, "where": where}
+        )
+
+    def record_current(self, name: str | None) -> None:
+        """Текущая очередь изменена"""
+        self._buffer.append({"op": "current", "name": name})
+
+    async def flush(self) -> None:
+        """Записывает накопленные изменения в бд одной транзакцией"""
+        async with self._lock:
+            if not self._buffer:
+                return
+            ops, self._buffer = self._buffer, []
+            if not await apply_queue_ops(ops):
+                self._buffer = ops + self._buffer
+
+    def discard(self) -> None:
+        """Отбрасывает изменения, которые не удалось записать в бд"""
+        self._buffer.clear()
+
+    async def compact(self, get_snapshot: Callable[[], QueuesData]) -> None:
+        """Полностью синхронизирует очереди в бд с состоянием в памяти"""
+        async with self._lock:
+            snapshot: QueuesData = get_snapshot()
+            # Текущая очередь в снимок не входит, ее изменение нужно сохранить
+            current_ops: list[dict[str, Any]] = [
+                record for record in self._buffer if record["op"] == "current"
+            ][-1:]
+            self._buffer.clear()
+            stored: Sequence[StoredQueue] | None = await get_stored_queues()
+            if stored is None:
+                logging.error("Queues were not synchronized with db")
+                self._buffer = current_ops + self._buffer
+                return
+            ops: list[dict[str, Any]] = [
+                {"op": "delete", "name": queue.name}
+                for queue in stored
+                if queue.name not in snapshot
+            ]
+            ops += [
+                {"op": "set", "name": name, "queue": tg_ids}
+                for name, tg_ids in snapshot.items()
+            ]
+            ops += current_ops
+            if not await apply_queue_ops(ops):
+                logging.error("Queues were not synchronized with db")
+                self._buffer = ops + self._buffer
+
+
+def create_queue_storage(backend: str) -> QueueStorage:
+    """Создает хранилище очередей по настройке queue_storage
+    Args:
+        backend (str): db — Postgres, file — json-снимок с журналом изменений
+    """
+    if backend == "db":
+        return DbQueueStorage()
+    return QueueJournal()
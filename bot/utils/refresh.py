@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+
+class RefreshScheduler:
+    """Отложенное объединенное обновление.
+    - mark помечает ключ устаревшим и планирует обновление через delay секунд
+    - Все ключи, помеченные за это время, обновляются одним вызовом refresh
+    - wait дожидается ближайшего завершенного обновления
+    """
+
+    def __init__(
+        self, delay: float, refresh: Callable[[set[str]], Awaitable[None]]
+    ) -> None:
+        """
+        Args:
+            delay (float): Окно объединения, секунды
+            refresh (Callable[[set[str]], Awaitable[None]]): Обновляет переданные ключи
+        """
+        self.delay: float = delay
+        self.refresh: Callable[[set[str]], Awaitable[None]] = refresh
+        self._dirty: set[str] = set()
+        self._done: asyncio.Future | None = None
+        """Завершается после обновления, в которое попадут текущие пометки"""
+        self._task: asyncio.Task | None = None
+        self._now = asyncio.Event()
+        """Выполнить запланированное обновление, не дожидаясь окна"""
+
+    @property
+    def pending(self) -> bool:
+        """Есть ли запланированное обновление"""
+        return self._done is not None
+
+    def mark(self, key: str) -> None:
+        """Помечает ключ устаревшим и планирует обновление"""
+        self._dirty.add(key)
+        if self._done is None:
+            self._done = asyncio.get_running_loop().create_future()
+            self._task = asyncio.create_task(self._run(self._done))
+
+    async def wait(self) -> None:
+        """Дожидается обновления, в которое попадут все текущие пометки.
+        Если обновлений не запланировано, возвращается сразу"""
+        if self._done is not None:
+            await asyncio.shield(self._done)
+
+    async def _run(self, done: asyncio.Future) -> None:
+        try:
+            await asyncio.wait_for(self._now.wait(), timeout=self.delay)
+        except asyncio.TimeoutError:
+            pass
+        # Пометки, сделанные во время обновления, уходят в следующее окно
+        keys, self._dirty = self._dirty, set()
+        self._done = None
+        self._task = None
+        try:
+            await self.refresh(keys)
+        except Exception as e:
+            logging.error(e)
+        finally:
+            if not done.done():
+                done.set_result(None)
+
+    async def stop(self) -> None:
+        """Сразу выполняет запланированное обновление"""
+        if self._task is None:
+            return
+        self._now.set()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._now.clear()
@@ -0,0 +1,185 @@
+import logging
+from enum import StrEnum
+from itertools import islice
+from typing import Mapping, Sequence
+
+from bot.db import User
+
+
+class RenderStyle(StrEnum):
+    """Вид вывода очереди"""
+
+    FULL = "full"
+    """Все участники"""
+    DESIRING = "desiring"
+    """Только желающие (номера сохраняются как в полной очереди)"""
+    TOP = "top"
+    """Первые участники от начала очереди"""
+    AROUND = "around"
+    """Участники вокруг заданной позиции (мое место ± k)"""
+
+
+VIEW_ALIASES: dict[str, RenderStyle] = {
+    "все": RenderStyle.FULL,
+    "all": RenderStyle.FULL,
+    "хотят": RenderStyle.DESIRING,
+    "desiring": RenderStyle.DESIRING,
+    "d": RenderStyle.DESIRING,
+    "топ": RenderStyle.TOP,
+    "top": RenderStyle.TOP,
+    "t": RenderStyle.TOP,
+    "я": RenderStyle.AROUND,
+    "me": RenderStyle.AROUND,
+    "m": RenderStyle.AROUND,
+}
+"""Названия видов вывода в аргументах команд /menu и /show"""
+
+
+DESIRE_MARK: dict[bool, str] = {True: "🟢", False: "🔴"}
+"""Статус желания для строк очереди"""
+DESIRE_INFO: dict[bool, str] = {True: " 🟢 хочет", False: " 🔴 не хочет"}
+"""Статус желания для информации о пользователе"""
+
+
+def parse_view(args: str | None) -> tuple[RenderStyle, int | None, str | None]:
+    """Разбирает вид вывода из аргументов команды: [вид [число]] [остаток]
+    Args:
+        args (str | None): Аргументы команды, например "топ 5" или "я 2 физика"
+    Returns:
+        tuple[RenderStyle, int | None, str | None]: Вид, число для вида (если указано)
+        и оставшиеся аргументы (None, если их нет)
+    """
+    words: list[str] = args.split() if args else []
+    if not words or words[0].lower() not in VIEW_ALIASES:
+        return RenderStyle.FULL, None, args
+    style: RenderStyle = VIEW_ALIASES[words.pop(0).lower()]
+    size: int | None = None
+    if words and words[0].isdigit():
+        size = int(words.pop(0))
+    return style, size, " ".join(words) or None
+
+
+def render_member(user: User) -> str:
+    """Возвращает строку участника очереди без номера: Иван 🟢 @username.
+    Вызывается один раз при загрузке или изменении пользователя
+    """
+    username: str = f"@{user.username}" if user.username is not None else ""
+    return f"{user.name} {DESIRE_MARK[user.has_desire]} {username}"
+
+
+def render_user_info(user: User) -> str:
+    """Форматирует информацию о пользователе
+    Добавляет строки только если соответствующие условия выполняются
+    """
+    parts: list[str] = [f"🆔 ID: {user.id}"]
+    if user.name:
+        parts.append(f" 👤 {user.name}")
+    if user.username:
+        parts.append(f" @{user.username}")
+    parts.append(DESIRE_INFO[user.has_desire])
+    if not user.trusted:
+        parts.append("\n⬆️ 🚫 Не доверенный 🚫 ⬆️")
+    return "".join(parts)
+
+
+_number_prefixes: list[str] = []
+"""Готовые номера строк вида "\n1. " (растут до размера самой длинной очереди)"""
+
+
+def _get_number_prefixes(count: int) -> list[str]:
+    """Возвращает готовые номера строк, дополняя их до count"""
+    for number in range(len(_number_prefixes) + 1, count + 1):
+        _number_prefixes.append(f"\n{number}. ")
+    return _number_prefixes
+
+
+def _join_rows(
+    header: str,
+    numbers: list[str],
+    tg_ids: Sequence[int],
+    lines: Mapping[int, str],
+    footer: str,
+) -> str:
+    """Склеивает заголовок, номера и строки участников одним join без промежуточных строк"""
+    try:
+        texts: list[str] = [lines[tg_id] for tg_id in tg_ids]
+    except KeyError:
+        logging.error("User in queue, but not in db")
+        rows: list[tuple[str, str]] = [
+            (number, lines[tg_id])
+            for number, tg_id in zip(numbers, tg_ids)
+            if tg_id in lines
+        ]
+        numbers = [number for number, _ in rows]
+        texts = [text for _, text in rows]
+    pieces: list[str] = [header] * (2 * len(texts) + 1)
+    pieces[1::2] = numbers
+    pieces[2::2] = texts
+    pieces.append(footer)
+    return "".join(pieces)
+
+
+def render_queue(
+    queue_name: str | None,
+    tg_ids: Sequence[int],
+    lines: Mapping[int, str],
+    desires: Mapping[int, bool],
+    style: RenderStyle = RenderStyle.FULL,
+    limit: int | None = None,
+    center: int | None = None,
+) -> str:
+    """Собирает текст очереди из готовых строк участников
+    Args:
+        queue_name (str | None): Название очереди для вывода
+        tg_ids (Sequence[int]): Участники по порядку
+        lines (Mapping[int, str]): Готовые строки участников по tg_id
+        desires (Mapping[int, bool]): Желание участников по tg_id
+        style (RenderStyle, optional): Вид вывода
+        limit (int | None, optional): Сколько участников показать для RenderStyle.TOP
+        или сколько соседей с каждой стороны для RenderStyle.AROUND
+        center (int | None, optional): Позиция (с 0), вокруг которой выводится RenderStyle.AROUND
+    Returns:
+        str: Текст со списком вида
+        1. Иван 🟢 @username
+        2. Максим 🔴 @username
+    """
+    if not queue_name:
+        queue_name = ""
+    if not tg_ids:
+        return f"✨ Очередь {queue_name} пуста ✨"
+    header: str = f"✨ Очередь {queue_name} ✨"
+    prefixes: list[str] = _get_number_prefixes(len(tg_ids))
+
+    if style is RenderStyle.DESIRING:
+        selected: list[tuple[int, int]] = [
+            (index, tg_id)
+            for index, tg_id in enumerate(tg_ids)
+            if desires.get(tg_id)
+        ]
+        if not selected:
+            return f"{header}\nЖелающих нет 🔴\n"
+        numbers: list[str] = [prefixes[index] for index, _ in selected]
+        return _join_rows(
+            header, numbers, [tg_id for _, tg_id in selected], lines, "\n"
+        )
+
+    size: int = len(tg_ids)
+    start, stop = 0, size
+    if style is RenderStyle.TOP and limit is not None:
+        stop = min(limit, size)
+    elif style is RenderStyle.AROUND and limit is not None and center is not None:
+        start, stop = max(center - limit, 0), min(center + limit + 1, size)
+    if (start, stop) == (0, size):
+        return _join_rows(header, prefixes[:size], tg_ids, lines, "\n")
+
+    # Из deque копируется только окно, а не вся очередь
+    if start:
+        header = f"{header}\n… выше еще {start}"
+    footer: str = f"\n… и еще {size - stop}\n" if stop < size else "\n"
+    return _join_rows(
+        header,
+        prefixes[start:stop],
+        list(islice(tg_ids, start, stop)),
+        lines,
+        footer,
+    )
@@ -1,20 +1,54 @@
 from pydantic import Field, SecretStr, field_validator
-from pydantic_settings import BaseSettings, SettingsConfigDict
+from pydantic_settings import BaseSettings, NoDecode, SettingsConfigDict
 
-from typing import Union
+from typing import Annotated, Literal
 
 
 class Settings(BaseSettings):
     token: str = Field()
-    admins: Union[list[int], str] = Field()
+    # NoDecode: строка из env разбирается parse_admins, а не как json
+    admins: Annotated[list[int], NoDecode] = Field()
+
+    run_mode: Literal["polling", "webhook"] = "polling"
+    webhook_url: str = ""
+    webhook_path: str = "/webhook"
+    webhook_secret: SecretStr | None = None
+    webapp_host: str = "0.0.0.0"
+    webapp_port: int = 8080
 
     storage_path: str = "data"
+    queue_storage: Literal["db", "file"] = "file"
+    queue_shared: bool = False
+    queues_autosave_interval: float = 60.0
+    queue_refresh_delay: float = 0.5
+    queue_top_size: int = 10
+    queue_around_size: int = 3
+    fsm_storage: Literal["db", "memory"] = "memory"
+    fsm_state_ttl: float = 86400.0
 
     db_user: str = "user"
     db_password: SecretStr = Field()
     db_host: str = "localhost"
     db_port: int = 5432
     db_name: str = "database"
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_statement_cache_size: int = 100
+
+    user_cache_size: int = 1024
+    user_cache_ttl: float = 300.0
+    users_page_size: int = 20
+
+    broadcast_rate: float = 30.0
+    broadcast_chat_rate: float = 1.0
+    broadcast_concurrency: int = 10
+    broadcast_max_retries: int = 3
+    broadcast_workers: int = 1
+    broadcast_progress_save_interval: float = 5.0
+    live_push_delay: float = 2.0
 
     @field_validator("admins", mode="before")
     @classmethod
@@ -30,6 +64,12 @@ class Settings(BaseSettings):
     def db_url(self) -> str:
         return f"postgresql+asyncpg://{self.db_user}:{self.db_password.get_secret_value()}@{self.db_host}:{self.db_port}/{self.db_name}"
 
+    @property
+    def webhook_secret_value(self) -> str | None:
+        if self.webhook_secret is None:
+            return None
+        return self.webhook_secret.get_secret_value() or None
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
 
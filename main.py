@@ -2,34 +2,113 @@ import asyncio
 import logging
 from asyncio.exceptions import CancelledError
 
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
 from bot.create_bot import bot, dp
-from bot.db import create_tables
+from bot.db import DbStorage, create_tables
 from bot.handlers import main_router
+from bot.middlewares import DbSessionMiddleware
 from bot.utils import create_folder, queue_manager
+from bot.utils.bot_settings import bot_settings
+from bot.utils.jobs import job_manager
+from bot.utils.live_queue import live_push, live_queue
 from config import settings
 
 
 async def start_bot() -> None:
     create_folder(settings.storage_path)
     await create_tables()
+    await bot_settings.load()
+    if isinstance(dp.storage, DbStorage):
+        await dp.storage.purge_expired()
     await queue_manager.load_from_file()
+    await queue_manager.start_sync()
+    await live_queue.load()
+    queue_manager.start_autosave(settings.queues_autosave_interval)
+    await job_manager.start()
+
+
+async def stop_bot() -> None:
+    await job_manager.stop()
+    await queue_manager.stop_sync()
+    await live_push.stop()
+    await bot.session.close()
+    await queue_manager.stop_autosave()
+    await queue_manager.save_to_file()
+
+
+async def set_webhook() -> None:
+    """Регистрирует webhook в Telegram.
+    Без WEBHOOK_URL не вызывается: апдейты можно отправлять на сервер вручную
+    """
+    if not settings.webhook_url:
+        logging.info("WEBHOOK_URL is not set, webhook is not registered")
+        return
+    await bot.set_webhook(
+        url=settings.webhook_url.rstrip("/") + settings.webhook_path,
+        secret_token=settings.webhook_secret_value,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=True,
+    )
+    logging.info(f"Webhook set to {settings.webhook_url}{settings.webhook_path}")
+
+
+async def run_polling() -> None:
+    dp.startup.register(start_bot)
+    try:
+        await bot.delete_webhook(drop_pending_updates=True)
+        await dp.start_polling(bot)
+
+    finally:
+        await stop_bot()
+
+
+async def run_webhook() -> None:
+    """Принимает апдейты через aiohttp-сервер вместо long polling.
+    start_bot и stop_bot выполняются при запуске и остановке приложения
+    """
+    dp.startup.register(start_bot)
+    dp.startup.register(set_webhook)
+    dp.shutdown.register(stop_bot)
+
+    app = web.Application()
+    # Проверяет заголовок X-Telegram-Bot-Api-Secret-Token, если секрет задан
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=settings.webhook_secret_value,
+    ).register(app, path=settings.webhook_path)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=settings.webapp_host, port=settings.webapp_port)
+    try:
+        await site.start()
+        logging.info(
+            f"Webhook server listening on "
+            f"{settings.webapp_host}:{settings.webapp_port}{settings.webhook_path}"
+        )
+        await asyncio.Event().wait()
+
+    finally:
+        await runner.cleanup()
 
 
 async def main() -> None:
     try:
+        dp.update.outer_middleware(DbSessionMiddleware())
         dp.include_router(main_router)
-        dp.startup.register(start_bot)
 
-        await bot.delete_webhook(drop_pending_updates=True)
-        await dp.start_polling(bot)
+        if settings.run_mode == "webhook":
+            await run_webhook()
+        else:
+            await run_polling()
 
     except CancelledError:
         logging.info("Bot turned off by cancel, handled CancelledError")
 
-    finally:
-        await bot.session.close()
-        await queue_manager.save_to_file()
-
 
 if __name__ == "__main__":
     asyncio.run(main())
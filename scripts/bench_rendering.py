@@ -0,0 +1,79 @@
+"""Микро-бенчмарк вывода очереди на 1000 участников
+
+Сравнивает старую сборку текста (`+=` в цикле, @username и статус
+вычисляются на каждый вывод) со сборкой из готовых строк участников.
+
+Запуск из корня проекта:
+    python -m scripts.bench_rendering
+"""
+
+from timeit import repeat
+
+from bot.db import User
+from bot.utils.rendering import RenderStyle, render_member, render_queue
+
+MEMBERS = 1000
+RUNS = 200
+
+
+def build_users(count: int) -> list[User]:
+    return [
+        User(
+            id=i,
+            tg_id=100_000 + i,
+            name=f"Пользователь {i}",
+            username=f"user_{i}" if i % 3 else None,
+            has_desire=i % 2 == 0,
+        )
+        for i in range(count)
+    ]
+
+
+def build_text_concat(queue_name: str, users: list[User]) -> str:
+    """Сборка текста, как до модуля rendering"""
+    result: str = f"✨ Очередь {queue_name} ✨\n"
+    for index, user in enumerate(users):
+        username: str = f"@{user.username}" if user.username is not None else ""
+        status: str = "🟢" if user.has_desire else "🔴"
+        result += f"{index + 1}. {user.name} {status} {username}\n"
+    return result
+
+
+def best_ms(statement, runs: int = RUNS) -> float:
+    """Лучшее время одного вызова в миллисекундах"""
+    return min(repeat(statement, number=runs, repeat=5)) / runs * 1000
+
+
+def main() -> None:
+    users: list[User] = build_users(MEMBERS)
+    tg_ids: list[int] = [user.tg_id for user in users]
+    lines: dict[int, str] = {user.tg_id: render_member(user) for user in users}
+    desires: dict[int, bool] = {user.tg_id: user.has_desire for user in users}
+    assert build_text_concat("bench", users) == render_queue(
+        "bench", tg_ids, lines, desires
+    )
+
+    results: dict[str, float] = {
+        "concat (old)": best_ms(lambda: build_text_concat("bench", users)),
+        "render full": best_ms(
+            lambda: render_queue("bench", tg_ids, lines, desires)
+        ),
+        "render desiring": best_ms(
+            lambda: render_queue(
+                "bench", tg_ids, lines, desires, style=RenderStyle.DESIRING
+            )
+        ),
+        "render top 10": best_ms(
+            lambda: render_queue(
+                "bench", tg_ids, lines, desires, style=RenderStyle.TOP, limit=10
+            )
+        ),
+    }
+    baseline: float = results["concat (old)"]
+    print(f"Queue of {MEMBERS} members, best of 5 x {RUNS} runs")
+    for name, ms in results.items():
+        print(f"{name:<16} {ms:8.3f} ms  x{baseline / ms:5.1f}")
+
+
+if __name__ == "__main__":
+    main()